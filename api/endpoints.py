@@ -7,30 +7,50 @@ import logging
 from api.models import *
 from core.database import get_database
 from core.rate_limiter import RateLimiter
-from core.circuit_breaker import CircuitBreaker
-from services.ai_llm import AIService
+from core.circuit_breaker import circuit_breakers
+from services.container import ServiceContainer, get_services
+from services.embedding_service import embedding_batcher, embedding_cache
+from services.question_embedding_service import QuestionEmbeddingService
+from services.job_queue import job_queue
 from services.qa_retrieval_service import QARetrievalService
-from services.rag_services import RAGService
+from services.validation_cache import validation_cache
+from services.vector_sweeper import vector_sweeper
+from services.question_duplicate_detector import question_duplicate_detector, DUPLICATE
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # Shared instances
 rate_limiter = RateLimiter(requests_per_minute=100)
-circuit_breaker = CircuitBreaker(failure_threshold=5, timeout=60)
 
 # Helper function for AI validation
-async def validate_question_with_ai(industry: str, question: str, existing_text: str):
-    """Centralized AI validation logic"""
-    ai_service = AIService()
+async def validate_question_with_ai(ai_service, org_id: str, industry: str, question: str, existing_questions: List[str]):
+    """Centralized AI validation logic, cached per org question set"""
+    fingerprint = validation_cache.fingerprint(existing_questions)
+    cached = validation_cache.get(org_id, question, industry, fingerprint)
+    if cached is not None:
+        return cached
+    
+    # Clear duplicates never reach the LLM; otherwise it only sees the nearest questions
+    duplicate_check = await question_duplicate_detector.check(question, existing_questions)
+    if duplicate_check.decision == DUPLICATE:
+        logger.info(f"Question rejected locally as duplicate (similarity {duplicate_check.best_similarity:.3f})")
+        validation = {"accepted": False, "reason": "Similar question already exists", "keywords": []}
+        validation_cache.put(org_id, question, industry, fingerprint, validation)
+        return validation
+    
+    existing_text = " ".join(duplicate_check.nearest_questions)
     validation_result = await ai_service.question_ai_validation_check(industry, question, existing_text)
     
     if validation_result[0] == 'Provide a relevant Question':
-        return {"accepted": False, "reason": "Provide a relevant Question to your organization type", "keywords": []}
+        validation = {"accepted": False, "reason": "Provide a relevant Question to your organization type", "keywords": []}
     elif validation_result[0] == '0':
-        return {"accepted": False, "reason": "Similar question already exists", "keywords": []}
+        validation = {"accepted": False, "reason": "Similar question already exists", "keywords": []}
     else:
-        return {"accepted": True, "keywords": validation_result}
+        validation = {"accepted": True, "keywords": validation_result}
+    
+    validation_cache.put(org_id, question, industry, fingerprint, validation)
+    return validation
 
 # Common response builder
 def build_question_response(accepted: bool, question: str, org_id: str, **kwargs):
@@ -43,30 +63,37 @@ def build_question_response(accepted: bool, question: str, org_id: str, **kwargs
     }
 
 @router.post("/organizations/{org_id}/questions", response_model=Dict[str, Any])
-async def add_single_question(org_id: str, question_data: SingleQuestionCreate, db=Depends(get_database)):
+async def add_single_question(org_id: str, question_data: SingleQuestionCreate, db=Depends(get_database),
+                              services: ServiceContainer = Depends(get_services)):
     """Add a single question to an organization"""
-    async with rate_limiter.acquire(f"question_{org_id}"), circuit_breaker.call():
+    # The mongodb breaker wraps only the database calls, not the AI validation or embedding
+    mongodb = circuit_breakers.get("mongodb", org_id)
+    async with rate_limiter.acquire(f"question_{org_id}"):
         if question_data.org_id != org_id:
             raise HTTPException(status_code=400, detail="org_id mismatch")
         
         # Create/get organization
-        existing_org = await db.organizations.find_one({"_id": ObjectId(org_id)})
-        if not existing_org:
-            raise HTTPException(status_code=400,detail="organization does not exists")
+        async with mongodb.call():
+            existing_org = await db.organizations.find_one({"_id": ObjectId(org_id)})
+            if not existing_org:
+                raise HTTPException(status_code=400,detail="organization does not exists")
+            existing_questions = await db.questions.find({"org_id": org_id}).to_list(length=None)
         
         # AI validation
-        existing_questions = await db.questions.find({"org_id": org_id}).to_list(length=None)
-        existing_text = " ".join([q["question_text"] for q in existing_questions])
-        validation = await validate_question_with_ai(existing_org["name"], question_data.question, existing_text)
+        validation = await validate_question_with_ai(services.ai_service, org_id, existing_org["name"], question_data.question,
+                                                     [q["question_text"] for q in existing_questions])
         
         if not validation["accepted"]:
             return build_question_response(False, question_data.question, org_id, 
                                          reason=validation["reason"])
         
-        # Save question
+        # Save question with its retrieval embedding
+        query_embedding = await QuestionEmbeddingService.compute(question_data.question, validation["keywords"])
         question = Question(org_id=org_id, question_text=question_data.question, 
-                          question_keywords=validation["keywords"])
-        q_result = await db.questions.insert_one(question.dict(by_alias=True))
+                          question_keywords=validation["keywords"], query_embedding=query_embedding)
+        async with mongodb.call():
+            q_result = await db.questions.insert_one(question.dict(by_alias=True))
+        validation_cache.invalidate_org(org_id)
         
         return build_question_response(True, question_data.question, org_id,
                                      question_id=str(q_result.inserted_id),
@@ -91,14 +118,17 @@ async def delete_question(org_id: str, question_id: str, db=Depends(get_database
         result = await db.questions.delete_one({"_id": question_obj_id, "org_id": org_id})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Question not found")
+        validation_cache.invalidate_org(org_id)
         
         return {"message": "Question deleted successfully", "question_id": question_id, 
                 "org_id": org_id, "deleted_question": question["question_text"]}
 
 @router.put("/organizations/{org_id}/questions/{question_id}", response_model=Dict[str, Any])
-async def update_question(org_id: str, question_id: str, question_update: QuestionUpdate, db=Depends(get_database)):
+async def update_question(org_id: str, question_id: str, question_update: QuestionUpdate, db=Depends(get_database),
+                          services: ServiceContainer = Depends(get_services)):
     """Update a question with AI validation"""
-    async with rate_limiter.acquire(f"question_update_{org_id}_{question_id}"), circuit_breaker.call():
+    mongodb = circuit_breakers.get("mongodb", org_id)
+    async with rate_limiter.acquire(f"question_update_{org_id}_{question_id}"):
         from bson import ObjectId
         from datetime import datetime
         
@@ -107,35 +137,39 @@ async def update_question(org_id: str, question_id: str, question_update: Questi
         except:
             raise HTTPException(status_code=400, detail="Invalid question_id format")
         
-        existing_question = await db.questions.find_one({"_id": question_obj_id, "org_id": org_id})
-        if not existing_question:
-            raise HTTPException(status_code=404, detail="Question not found")
-        
-        org = await db.organizations.find_one({"org_id": org_id, "is_active": True})
-        if not org:
-            raise HTTPException(status_code=404, detail="Organization not found")
-        
-        # Get other questions for validation
-        other_questions = await db.questions.find({"org_id": org_id, "_id": {"$ne": question_obj_id}}).to_list(length=None)
-        existing_text = " ".join([q["question_text"] for q in other_questions])
+        async with mongodb.call():
+            existing_question = await db.questions.find_one({"_id": question_obj_id, "org_id": org_id})
+            if not existing_question:
+                raise HTTPException(status_code=404, detail="Question not found")
+            
+            org = await db.organizations.find_one({"org_id": org_id, "is_active": True})
+            if not org:
+                raise HTTPException(status_code=404, detail="Organization not found")
+            
+            # Get other questions for validation
+            other_questions = await db.questions.find({"org_id": org_id, "_id": {"$ne": question_obj_id}}).to_list(length=None)
         
         # AI validation
-        validation = await validate_question_with_ai(org["industry"], question_update.question, existing_text)
+        validation = await validate_question_with_ai(services.ai_service, org_id, org["industry"], question_update.question,
+                                                     [q["question_text"] for q in other_questions])
         
         if not validation["accepted"]:
             return build_question_response(False, question_update.question, org_id,
                                          reason=validation["reason"], question_id=question_id,
                                          original_question=existing_question["question_text"])
         
-        # Update question
-        update_result = await db.questions.update_one(
-            {"_id": question_obj_id, "org_id": org_id},
-            {"$set": {"question_text": question_update.question, "question_keywords": validation["keywords"],
-                     "updated_at": datetime.utcnow()}}
-        )
+        # Update question and its retrieval embedding
+        query_embedding = await QuestionEmbeddingService.compute(question_update.question, validation["keywords"])
+        async with mongodb.call():
+            update_result = await db.questions.update_one(
+                {"_id": question_obj_id, "org_id": org_id},
+                {"$set": {"question_text": question_update.question, "question_keywords": validation["keywords"],
+                         "query_embedding": query_embedding, "updated_at": datetime.utcnow()}}
+            )
         
         if update_result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Question not found")
+        validation_cache.invalidate_org(org_id)
         
         return build_question_response(True, question_update.question, org_id,
                                      question_id=question_id, original_question=existing_question["question_text"],
@@ -160,12 +194,57 @@ async def get_organization_questions(org_id: str, db=Depends(get_database)):
             "updated_at": q.get("updated_at").isoformat() if q.get("updated_at") else None
         } for q in questions]
 
-@router.post("/organizations/conversations/", response_model=Dict[str, Any])
-async def process_conversation(call_sid: str, db=Depends(get_database)):
-    rag_service = RAGService(db)
-    result = await rag_service.process_call_for_qa_pairs(call_sid)
-    logger.info(f"QA processing result: {result}")
-    return result
+def build_job_response(job: Dict[str, Any]) -> JobStatusResponse:
+    """Build the public view of a processing job"""
+    return JobStatusResponse(
+        job_id=str(job["_id"]),
+        kind=job.get("kind", "call"),
+        call_sid=job.get("call_sid"),
+        call_count=len(job["call_sids"]) if job.get("call_sids") else None,
+        status=job["status"],
+        progress=job.get("progress") or {},
+        attempts=job.get("attempts", 0),
+        result=job.get("result"),
+        error=job.get("error"),
+        created_at=job["created_at"].isoformat(),
+        updated_at=job["updated_at"].isoformat()
+    )
+
+@router.post("/organizations/conversations/", response_model=JobStatusResponse, status_code=202)
+async def process_conversation(call_sid: str, force: bool = False):
+    """
+    Queue a call for QA processing and return the job to poll.
+    Already processed calls are skipped unless force is set.
+    """
+    job = await job_queue.enqueue(call_sid, force=force)
+    logger.info(f"Queued QA processing job {job['_id']} for call {call_sid}")
+    return build_job_response(job)
+
+@router.post("/organizations/conversations/bulk", response_model=JobStatusResponse, status_code=202)
+async def process_conversations_bulk(request: BulkProcessRequest):
+    """
+    Queue many calls for the staged bulk pipeline and return the job to poll.
+    The job result reports per-call failures and throughput.
+    """
+    job = await job_queue.enqueue_bulk(request.call_sids, force=request.force)
+    logger.info(f"Queued bulk QA processing job {job['_id']} for {len(job['call_sids'])} calls")
+    return build_job_response(job)
+
+@router.get("/jobs/stats", response_model=Dict[str, Any])
+async def get_job_stats():
+    """Job consumer stats for this worker"""
+    return job_queue.stats()
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """Get the status and progress of a processing job"""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job_id format")
+    
+    job = await job_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return build_job_response(job)
 
 
 @router.get("/organizations/{org_id}/conversations/{conv_id}/qa-pairs", response_model=List[QAResponse])
@@ -174,4 +253,25 @@ async def get_qa_pairs(org_id: str, conv_id: str, db=Depends(get_database)):
     async with rate_limiter.acquire(f"qa_get_{org_id}_{conv_id}"):
         qa_service = QARetrievalService(db)
         return await qa_service.get_qa_pairs(org_id, conv_id)
-    
+
+
+@router.get("/embeddings/stats", response_model=Dict[str, Any])
+async def get_embedding_stats():
+    """Embedding micro-batching metrics (batch sizes and queue wait) and cache hit rates"""
+    return {"batching": embedding_batcher.stats(), "cache": embedding_cache.stats()}
+
+@router.get("/services/stats", response_model=Dict[str, Any])
+async def get_service_stats(services: ServiceContainer = Depends(get_services)):
+    """Shared OpenAI connection pool usage, validation cache hit rate and vector cleanup"""
+    return {"openai_pool": services.pool_stats(), "validation_cache": validation_cache.stats(),
+            "vector_sweeper": vector_sweeper.stats()}
+
+@router.get("/rate-limits/stats", response_model=Dict[str, Any])
+async def get_rate_limit_stats():
+    """Tracked rate limit keys and their memory footprint"""
+    return await rate_limiter.stats()
+
+@router.get("/circuit-breakers/stats", response_model=Dict[str, Any])
+async def get_circuit_breaker_stats():
+    """State and counters of every dependency circuit breaker"""
+    return circuit_breakers.stats()
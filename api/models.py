@@ -50,6 +50,7 @@ class Question(BaseMongoModel):
     org_id: str = Field(...)
     question_text: str = Field(..., min_length=3, max_length=500)
     question_keywords: List[str] = Field(default_factory=list)
+    query_embedding: Optional[Dict[str, Any]] = Field(default=None)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = Field(default=None)
 
@@ -91,3 +92,20 @@ class QAResponse(BaseModel):
     question: str
     answer: str
     createdAt: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str = "call"  # "call" or "bulk"
+    call_sid: Optional[str] = None
+    call_count: Optional[int] = None  # calls in a bulk job
+    status: ProcessingStatus
+    progress: Dict[str, Any] = Field(default_factory=dict)
+    attempts: int = 0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
+
+class BulkProcessRequest(BaseModel):
+    call_sids: List[str] = Field(..., min_length=1, max_length=10000)
+    force: bool = Field(default=False)
@@ -0,0 +1,301 @@
+# benchmarks/e2e.py
+"""
+End-to-end throughput benchmark, fully offline.
+
+Seeds a local MongoDB with synthetic orgs, questions and calls, starts the
+fake OpenAI server and the API (uvicorn main:app) against them, then at each
+concurrency level:
+  - queues calls with POST /organizations/conversations/ and polls their jobs
+  - drives the question and QA pair read endpoints
+and writes calls/min, p50/p95/p99 per endpoint, LLM calls per processed call
+and peak RSS as JSON.
+
+Requires a local mongod and the embedding model in the local Hugging Face cache.
+
+Usage: python -m benchmarks.e2e --concurrency 1,4,16 --output benchmarks/results/e2e.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+import psutil
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.synthetic import make_dataset
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROCESS_ENDPOINT = "POST /organizations/conversations/"
+JOB_ENDPOINT = "job end-to-end"
+QUESTIONS_ENDPOINT = "GET /organizations/{org_id}/questions"
+QA_PAIRS_ENDPOINT = "GET /organizations/{org_id}/conversations/{conv_id}/qa-pairs"
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+    
+    def record(self, endpoint: str, seconds: float, status: Any):
+        self.samples.setdefault(endpoint, []).append(seconds)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    
+    def summary(self) -> Dict[str, Any]:
+        result = {}
+        for endpoint, samples in self.samples.items():
+            ordered = sorted(samples)
+            result[endpoint] = {
+                "count": len(ordered),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+                "statuses": self.statuses[endpoint]
+            }
+        return result
+
+class RssSampler(threading.Thread):
+    """Tracks the peak resident memory of a process tree"""
+    
+    def __init__(self, pid: int, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                processes = [self.process] + self.process.children(recursive=True)
+                self.peak = max(self.peak, sum(p.memory_info().rss for p in processes if p.is_running()))
+            except psutil.Error:
+                pass
+            self._stop_event.wait(self.interval)
+    
+    def stop(self):
+        self._stop_event.set()
+
+async def seed_database(mongodb_url: str, database_name: str, args) -> Dict[str, Any]:
+    client = AsyncIOMotorClient(mongodb_url, serverSelectionTimeoutMS=3000)
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        raise SystemExit(f"MongoDB is not reachable at {mongodb_url}: {e}")
+    
+    await client.drop_database(database_name)
+    database = client[database_name]
+    dataset = make_dataset(args.seed, args.orgs, args.questions_per_org, args.calls_per_org, args.turns_per_call)
+    await database.organizations.insert_many(dataset["organizations"])
+    await database.questions.insert_many(dataset["questions"])
+    await database.Call.insert_many(dataset["calls"])
+    client.close()
+    return dataset
+
+def start_process(command: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+async def wait_until_ready(url: str, timeout: float, process: subprocess.Popen, log_path: str):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise SystemExit(f"{url} exited during startup; see {log_path}")
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"{url} did not become ready within {timeout}s; see {log_path}")
+
+async def process_calls(client: httpx.AsyncClient, call_sids: List[str], concurrency: int,
+                        recorder: LatencyRecorder, poll_interval: float, job_timeout: float) -> Dict[str, int]:
+    """Queue each call and poll its job until it finishes"""
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes = {"completed": 0, "failed": 0, "rejected": 0, "timed_out": 0}
+    
+    async def one(call_sid: str):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/organizations/conversations/", params={"call_sid": call_sid, "force": "true"})
+            recorder.record(PROCESS_ENDPOINT, time.perf_counter() - started, response.status_code)
+            if response.status_code != 202:
+                outcomes["rejected"] += 1
+                return
+            job_id = response.json()["job_id"]
+            
+            deadline = started + job_timeout
+            while time.perf_counter() < deadline:
+                await asyncio.sleep(poll_interval)
+                job = (await client.get(f"/jobs/{job_id}")).json()
+                if job.get("status") in ("completed", "failed"):
+                    outcomes[job["status"]] += 1
+                    recorder.record(JOB_ENDPOINT, time.perf_counter() - started, job["status"])
+                    return
+            outcomes["timed_out"] += 1
+    
+    await asyncio.gather(*(one(call_sid) for call_sid in call_sids))
+    return outcomes
+
+async def drive_reads(client: httpx.AsyncClient, dataset: Dict[str, Any], requests: int, concurrency: int,
+                      recorder: LatencyRecorder):
+    """Alternate the question list and QA pair endpoints across orgs and calls"""
+    calls = itertools.cycle(dataset["calls"])
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one(number: int):
+        async with semaphore:
+            call = next(calls)
+            org_id = str(call["organizationId"])
+            if number % 2 == 0:
+                endpoint, path = QUESTIONS_ENDPOINT, f"/organizations/{org_id}/questions"
+            else:
+                endpoint, path = QA_PAIRS_ENDPOINT, f"/organizations/{org_id}/conversations/{call['call_sid']}/qa-pairs"
+            started = time.perf_counter()
+            response = await client.get(path)
+            recorder.record(endpoint, time.perf_counter() - started, response.status_code)
+    
+    await asyncio.gather(*(one(number) for number in range(requests)))
+
+async def run_level(app_url: str, openai_url: str, dataset: Dict[str, Any], concurrency: int, args) -> Dict[str, Any]:
+    recorder = LatencyRecorder()
+    limits = httpx.Limits(max_connections=concurrency * 2 + 10)
+    async with httpx.AsyncClient(base_url=app_url, timeout=120.0, limits=limits) as client, \
+            httpx.AsyncClient(base_url=openai_url) as openai_client:
+        await openai_client.post("/stats/reset")
+        call_sids = [call["call_sid"] for call in itertools.islice(itertools.cycle(dataset["calls"]), args.calls_per_level)]
+        
+        started = time.perf_counter()
+        outcomes = await process_calls(client, call_sids, concurrency, recorder, args.poll_interval, args.job_timeout)
+        elapsed = time.perf_counter() - started
+        llm_stats = (await openai_client.get("/stats")).json()
+        
+        await drive_reads(client, dataset, args.reads_per_level, concurrency, recorder)
+    
+    return {
+        "concurrency": concurrency,
+        "calls": outcomes,
+        "elapsed_seconds": round(elapsed, 3),
+        "calls_per_minute": round(outcomes["completed"] / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "llm_calls_per_processed_call": round(llm_stats["requests"] / outcomes["completed"], 3) if outcomes["completed"] else None,
+        "llm": llm_stats,
+        "endpoints": recorder.summary()
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+async def main(args):
+    dataset = await seed_database(args.mongodb_url, args.database, args)
+    log_dir = tempfile.mkdtemp(prefix="bench-logs-")
+    openai_url = f"http://127.0.0.1:{args.openai_port}"
+    app_url = f"http://127.0.0.1:{args.app_port}"
+    
+    fake_openai = start_process(
+        [sys.executable, "-m", "benchmarks.fake_openai", "--port", str(args.openai_port),
+         "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+         "--failure-rate", str(args.failure_rate)],
+        dict(os.environ), os.path.join(log_dir, "fake_openai.log")
+    )
+    app_env = dict(
+        os.environ,
+        OPENAI_API_KEY="benchmark",
+        OPENAI_BASE_URL=f"{openai_url}/v1",
+        MONGODB_URL=args.mongodb_url,
+        DATABASE_NAME=args.database,
+        VECTOR_BACKEND="memory",
+        LOG_LEVEL="WARNING",
+        PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix="bench-metrics-"),
+        HF_HUB_OFFLINE="1"
+    )
+    app = start_process(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.app_port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        app_env, os.path.join(log_dir, "app.log")
+    )
+    sampler = None
+    try:
+        await wait_until_ready(f"{openai_url}/stats", 30, fake_openai, os.path.join(log_dir, "fake_openai.log"))
+        await wait_until_ready(f"{app_url}/health", args.startup_timeout, app, os.path.join(log_dir, "app.log"))
+        sampler = RssSampler(app.pid)
+        sampler.start()
+        
+        levels = []
+        for concurrency in args.concurrency:
+            print(f"Running concurrency {concurrency}...", file=sys.stderr)
+            levels.append(await run_level(app_url, openai_url, dataset, concurrency, args))
+    finally:
+        if sampler:
+            sampler.stop()
+        for process in (app, fake_openai):
+            process.terminate()
+            try:
+                process.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    
+    report = {
+        "benchmark": "e2e",
+        "timestamp": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "mongodb_url")},
+        "peak_rss_bytes": sampler.peak if sampler else None,
+        "levels": levels,
+        "logs": log_dir
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongodb-url", default=os.getenv("BENCH_MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default="callcenter_benchmark")
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")], default=[1, 4, 16])
+    parser.add_argument("--calls-per-level", type=int, default=50)
+    parser.add_argument("--reads-per-level", type=int, default=200)
+    parser.add_argument("--orgs", type=int, default=5)
+    parser.add_argument("--questions-per-org", type=int, default=8)
+    parser.add_argument("--calls-per-org", type=int, default=20)
+    parser.add_argument("--turns-per-call", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--app-port", type=int, default=8600)
+    parser.add_argument("--openai-port", type=int, default=8601)
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--job-timeout", type=float, default=300.0)
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="Write the JSON report here as well as to stdout")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,96 @@
+# benchmarks/fake_openai.py
+"""
+Local OpenAI-compatible chat completions server for offline benchmarks.
+
+Usage: python -m benchmarks.fake_openai --port 8601 --latency-ms 300 --jitter-ms 100 --failure-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+config = {"latency_ms": 300.0, "jitter_ms": 100.0, "failure_rate": 0.0}
+stats = {"requests": 0, "failures": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def _content_for(messages: List[Dict[str, Any]], body: Dict[str, Any]) -> str:
+    """Plausible content for each kind of prompt the service sends"""
+    prompt = messages[-1].get("content", "") if messages else ""
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        # Batched extraction: answer every numbered question
+        questions_section = prompt.split("Questions to answer:", 1)[-1]
+        numbers = [int(number) for number in re.findall(r"^(\d+)\. ", questions_section, re.MULTILINE)]
+        return json.dumps({"answers": [
+            {"question_number": number, "answer": f"Synthetic answer {number} from the call."} for number in numbers
+        ]})
+    
+    match = re.search(r"New question: (.+)", prompt)
+    if match:
+        # Question validation: return keywords
+        words = re.findall(r"[A-Za-z]+", match.group(1))
+        return ", ".join(word.lower() for word in words[-3:]) or "question"
+    return "Synthetic answer from the call."
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    delay = max(0.0, random.gauss(config["latency_ms"], config["jitter_ms"])) / 1000
+    await asyncio.sleep(delay)
+    
+    if random.random() < config["failure_rate"]:
+        stats["failures"] += 1
+        status = random.choice([429, 500, 503])
+        return JSONResponse(status_code=status, content={"error": {"message": "Injected failure", "type": "server_error"}})
+    
+    messages = body.get("messages", [])
+    content = _content_for(messages, body)
+    prompt_tokens = sum(_estimate_tokens(message.get("content", "")) for message in messages)
+    completion_tokens = _estimate_tokens(content)
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens}
+    }
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+@app.post("/stats/reset")
+async def reset_stats():
+    for key in stats:
+        stats[key] = 0
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8601)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    config.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+# benchmarks/micro.py
+"""
+Microbenchmarks for hot primitives, compared against stored baselines.
+
+Host contention on shared machines slows whole stretches of a run by tens
+of percent, so absolute timings are not comparable between runs. Each
+timed round is therefore paired with a fixed pure-Python reference
+workload timed just before it, and the gate compares the median of
+round cost / reference cost (relative_cost), which stays within a few
+percent from run to run where seconds per op swing by half. The fastest
+round's seconds per op is reported alongside for reading. The run is also
+pinned to one CPU (--cpu), every benchmark gets an untimed warm-up round,
+and the garbage collector is off while a round is timed.
+
+A relative cost above its baseline by more than the threshold (a fraction,
+per benchmark in baselines.json or --threshold) is a regression, and a
+benchmark with no baseline or one that errors is a failure; either makes
+the run exit with status 1. Baselines are only meaningful for the Python
+version and machine type they were recorded on.
+
+Usage:
+  python -m benchmarks.micro                          # compare with benchmarks/baselines.json
+  python -m benchmarks.micro --only rate_limiter      # benchmarks whose name starts with a prefix
+  python -m benchmarks.micro --update-baselines       # record the current machine's numbers
+
+Embedding, chunking and Chroma benchmarks need the embedding model in the local
+Hugging Face cache. Without it they are reported as skipped, which does not
+fail the run unless --require-model is given.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+
+from benchmarks.synthetic import make_transcript
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_ROUNDS = 60
+REFERENCE_ITERATIONS = 20000
+
+def words_transcript(words: int, seed: int = 7) -> str:
+    """A speaker-turn transcript of roughly the given word count"""
+    import random
+    rng = random.Random(seed)
+    transcript = make_transcript(rng, 200)
+    repeats = max(1, words // max(1, len(transcript.split())))
+    return "\n".join([transcript] * repeats)
+
+def reference_round() -> float:
+    """Seconds taken by a fixed dict-and-integer workload, the yardstick for relative_cost"""
+    counts: Dict[int, int] = {}
+    started = time.perf_counter()
+    for i in range(REFERENCE_ITERATIONS):
+        counts[i & 255] = counts.get(i & 255, 0) + i
+    return time.perf_counter() - started
+
+def time_rounds(run_round: Callable[[], int], rounds: int) -> Dict[str, float]:
+    """
+    {"seconds_per_op", "relative_cost"} for a benchmark; run_round performs a
+    round and returns its op count. seconds_per_op is the fastest round's,
+    relative_cost the median over rounds of seconds per op divided by the
+    reference round timed just before it.
+    """
+    run_round()  # warm-up: imports, caches and lazy initialization
+    samples = []
+    ratios = []
+    for _ in range(rounds):
+        gc.collect()
+        gc.disable()
+        try:
+            reference = reference_round()
+            started = time.perf_counter()
+            operations = run_round()
+            seconds_per_op = (time.perf_counter() - started) / max(1, operations)
+        finally:
+            gc.enable()
+        samples.append(seconds_per_op)
+        ratios.append(seconds_per_op / reference)
+    return {"seconds_per_op": min(samples), "relative_cost": statistics.median(ratios)}
+
+def pin_to_cpu(cpu: Optional[int]) -> Optional[int]:
+    """Pin this process to one CPU (the last allowed one by default) where the OS supports it"""
+    if not hasattr(os, "sched_setaffinity"):
+        return None
+    allowed = sorted(os.sched_getaffinity(0))
+    cpu = allowed[-1] if cpu is None else cpu
+    os.sched_setaffinity(0, {cpu})
+    return cpu
+
+def embedding_model_cached() -> bool:
+    """Whether the embedding model can be loaded without a download"""
+    from huggingface_hub import snapshot_download
+    from core.config import settings
+    from services.embedding_service import hub_model_id
+    try:
+        snapshot_download(hub_model_id(settings.EMBEDDING_MODEL), local_files_only=True)
+        return True
+    except Exception:
+        return False
+
+# Benchmarks: name -> callable(rounds) returning time_rounds() measurements
+
+def bench_chunk_text(words: int):
+    def bench(rounds: int) -> Dict[str, float]:
+        from services.vector_service import VectorService
+        from services.vector_backends import InMemoryVectorBackend
+        service = VectorService(backend=InMemoryVectorBackend())
+        text = words_transcript(words)
+        return time_rounds(lambda: (service.chunk_text(text), 1)[1], rounds)
+    return bench
+
+def bench_encode(batch_size: int):
+    def bench(rounds: int) -> Dict[str, float]:
+        from services.embedding_service import global_embedding_service
+        counter = iter(range(10 ** 9))
+        
+        def run_round() -> int:
+            # Unique texts so the embedding cache never answers
+            round_id = next(counter)
+            global_embedding_service.encode([
+                f"Customer: I need help with order {round_id}-{i}, it has not arrived." for i in range(batch_size)
+            ])
+            return batch_size
+        
+        return time_rounds(run_round, rounds)
+    return bench
+
+def bench_chroma_store_and_search(rounds: int) -> Dict[str, float]:
+    from core.config import settings
+    settings.CHROMADB_PATH = tempfile.mkdtemp(prefix="bench-chroma-")
+    from services.vector_backends import ChromaVectorBackend
+    from services.vector_service import VectorService
+    service = VectorService(backend=ChromaVectorBackend())
+    text = words_transcript(5000)
+    counter = iter(range(10 ** 9))
+    
+    async def cycle():
+        conversation_id = f"bench_{next(counter)}"
+        await service.store_conversation(conversation_id, text)
+        await service.search_similar(conversation_id, "What is the caller's phone number?", top_k=5)
+        service.backend._delete_collection(conversation_id)
+    
+    return time_rounds(lambda: (asyncio.run(cycle()), 1)[1], rounds)
+
+def bench_rate_limiter(backend: str, tasks: int = 100, acquires_per_task: int = 50, keys: int = 10):
+    def bench(rounds: int) -> Dict[str, float]:
+        from core.config import settings
+        settings.RATE_LIMIT_SHARED_PATH = os.path.join(tempfile.mkdtemp(prefix="bench-rl-"), "buckets")
+        from core.rate_limiter import RateLimiter
+        limiter = RateLimiter(requests_per_minute=10 ** 9, backend=backend)
+        
+        async def contend():
+            async def worker(number: int):
+                for i in range(acquires_per_task):
+                    async with limiter.acquire(f"bench_{(number + i) % keys}"):
+                        pass
+            await asyncio.gather(*(worker(number) for number in range(tasks)))
+        
+        return time_rounds(lambda: (asyncio.run(contend()), tasks * acquires_per_task)[1], rounds)
+    return bench
+
+def bench_circuit_breaker(rounds: int, operations: int = 20000) -> Dict[str, float]:
+    from core.circuit_breaker import CircuitBreaker
+    breaker = CircuitBreaker(name="bench")
+    
+    async def calls():
+        for _ in range(operations):
+            async with breaker.call():
+                pass
+    
+    return time_rounds(lambda: (asyncio.run(calls()), operations)[1], rounds)
+
+BENCHMARKS: Dict[str, Callable[[int], float]] = {
+    "chunk_text_10k_words": bench_chunk_text(10_000),
+    "chunk_text_50k_words": bench_chunk_text(50_000),
+    "chunk_text_200k_words": bench_chunk_text(200_000),
+    "encode_batch_1": bench_encode(1),
+    "encode_batch_16": bench_encode(16),
+    "encode_batch_128": bench_encode(128),
+    "chroma_store_and_search": bench_chroma_store_and_search,
+    "rate_limiter_acquire_local": bench_rate_limiter("local"),
+    "rate_limiter_acquire_shared": bench_rate_limiter("shared"),
+    "circuit_breaker_call": bench_circuit_breaker,
+}
+
+# Benchmarks that load the embedding model or its tokenizer
+MODEL_BENCHMARKS = {name for name in BENCHMARKS if name.startswith(("chunk_text_", "encode_batch_", "chroma_"))}
+
+def load_baselines(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"benchmarks": {}}
+
+def compare(name: str, measured: Dict[str, float], baseline: Optional[Dict[str, Any]], default_threshold: float) -> Dict[str, Any]:
+    result = dict(measured)
+    if not baseline or not baseline.get("relative_cost"):
+        result["status"] = "no_baseline"
+        return result
+    threshold = baseline.get("threshold", default_threshold)
+    change = measured["relative_cost"] / baseline["relative_cost"] - 1.0
+    result.update(
+        baseline_relative_cost=baseline["relative_cost"],
+        baseline_seconds_per_op=baseline.get("seconds_per_op"),
+        change=round(change, 4),
+        threshold=threshold,
+        status="regression" if change > threshold else "ok"
+    )
+    return result
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="", help="Comma-separated benchmark name prefixes")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument("--threshold", type=float, default=None,
+                        help=f"Allowed slowdown as a fraction when a baseline sets none (default {DEFAULT_THRESHOLD})")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--output", default=None, help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--cpu", type=int, default=None, help="CPU to pin the run to (default: the last allowed one)")
+    parser.add_argument("--require-model", action="store_true",
+                        help="Fail instead of skipping benchmarks that need the embedding model when it is not cached")
+    args = parser.parse_args(argv)
+    
+    prefixes = [prefix for prefix in args.only.split(",") if prefix]
+    selected = [name for name in BENCHMARKS if not prefixes or any(name.startswith(p) for p in prefixes)]
+    baselines = load_baselines(args.baselines)
+    default_threshold = args.threshold if args.threshold is not None else baselines.get("default_threshold", DEFAULT_THRESHOLD)
+    cpu = pin_to_cpu(args.cpu)
+    model_cached = not MODEL_BENCHMARKS.intersection(selected) or embedding_model_cached()
+    
+    results = {}
+    for name in selected:
+        if name in MODEL_BENCHMARKS and not model_cached and not args.require_model:
+            results[name] = {"status": "skipped", "reason": "embedding model not in the local Hugging Face cache"}
+            continue
+        print(f"Running {name}...", file=sys.stderr)
+        try:
+            measured = BENCHMARKS[name](args.rounds)
+        except Exception as e:
+            results[name] = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+            continue
+        results[name] = compare(name, measured, baselines["benchmarks"].get(name), default_threshold)
+    
+    report = {
+        "benchmark": "micro",
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu": cpu,
+        "rounds": args.rounds,
+        "default_threshold": default_threshold,
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    
+    if args.update_baselines:
+        for name, result in results.items():
+            if "relative_cost" in result:
+                entry = baselines["benchmarks"].setdefault(name, {})
+                entry["relative_cost"] = result["relative_cost"]
+                entry["seconds_per_op"] = result["seconds_per_op"]
+        baselines.update(updated_at=report["timestamp"], python=report["python"], machine=report["machine"])
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return 0
+    
+    # A benchmark that cannot be compared must not pass silently; only a missing model is skipped
+    return 0 if all(result["status"] in ("ok", "skipped") for result in results.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# benchmarks/synthetic.py
+"""Deterministic synthetic organizations, questions and call transcripts for benchmarks."""
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from bson import ObjectId
+
+INDUSTRIES = ["Plumbing", "Dental Clinic", "Auto Repair", "Real Estate", "Insurance", "Internet Provider"]
+
+QUESTION_TEMPLATES = [
+    "What is the caller's full name?",
+    "What is the best callback phone number?",
+    "What service is the caller asking about?",
+    "When would the caller like to schedule an appointment?",
+    "What is the caller's address?",
+    "Has the caller used our services before?",
+    "What budget did the caller mention?",
+    "How did the caller hear about us?",
+    "Is the request urgent?",
+    "What is the caller's email address?",
+    "What problem is the caller experiencing?",
+    "Which payment method does the caller prefer?",
+]
+
+FIRST_NAMES = ["Alex", "Jordan", "Sam", "Taylor", "Morgan", "Casey", "Riley", "Jamie"]
+LAST_NAMES = ["Smith", "Garcia", "Chen", "Okafor", "Novak", "Haddad", "Silva", "Kim"]
+SERVICES = ["a leaking pipe", "a routine cleaning", "brake replacement", "a two bedroom rental",
+            "a home insurance quote", "slow internet speeds"]
+FILLER = [
+    "Let me check that for you.", "Thanks for holding.", "Could you repeat that please?",
+    "Sure, no problem at all.", "I appreciate your patience today.", "Okay, I have noted that down.",
+    "That makes sense.", "Is there anything else I can help with?",
+]
+
+def make_transcript(rng: random.Random, turns: int) -> str:
+    """A two-speaker call that mentions the facts the question templates ask about"""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    facts = [
+        f"My name is {name}.",
+        f"You can reach me at 555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}.",
+        f"I'm calling about {rng.choice(SERVICES)}.",
+        f"Could we do {rng.choice(['Monday', 'Tuesday', 'Friday'])} at {rng.randint(8, 17)}:00?",
+        f"I live at {rng.randint(10, 9999)} {rng.choice(['Oak', 'Pine', 'Main', 'Elm'])} Street.",
+        f"My budget is around {rng.randint(1, 20) * 100} dollars.",
+        f"My email is {name.split()[0].lower()}@example.com.",
+    ]
+    lines = []
+    for turn in range(turns):
+        if turn % 2 == 0:
+            lines.append(f"Agent: {' '.join(rng.sample(FILLER, 2))}")
+        else:
+            fact = facts[(turn // 2) % len(facts)]
+            lines.append(f"Customer: {fact} {rng.choice(FILLER)}")
+    return "\n".join(lines)
+
+def make_dataset(
+    seed: int = 7,
+    orgs: int = 5,
+    questions_per_org: int = 8,
+    calls_per_org: int = 20,
+    turns_per_call: int = 40
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Documents for the organizations, questions and Call collections"""
+    rng = random.Random(seed)
+    started = datetime(2025, 1, 1)
+    dataset = {"organizations": [], "questions": [], "calls": []}
+    
+    for org_number in range(orgs):
+        org_id = ObjectId()
+        industry = INDUSTRIES[org_number % len(INDUSTRIES)]
+        dataset["organizations"].append({"_id": org_id, "name": f"Bench {industry} {org_number}", "industry": industry})
+        
+        for question_text in rng.sample(QUESTION_TEMPLATES, min(questions_per_org, len(QUESTION_TEMPLATES))):
+            dataset["questions"].append({
+                "org_id": str(org_id),
+                "question_text": question_text,
+                "question_keywords": [word.strip("?'s").lower() for word in question_text.split()[-2:]],
+                "created_at": started
+            })
+        
+        for call_number in range(calls_per_org):
+            dataset["calls"].append({
+                "call_sid": f"BENCH{org_number:03d}{call_number:05d}",
+                "organizationId": org_id,
+                "call_transcript": make_transcript(rng, turns_per_call),
+                "createdAt": started + timedelta(minutes=call_number),
+                "qa_processed": False
+            })
+    return dataset
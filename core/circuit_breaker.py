@@ -1,58 +1,197 @@
 # core/circuit_breaker.py
 import asyncio
+import math
+import sqlite3
 import time
 from contextlib import asynccontextmanager
 from enum import Enum
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 from fastapi import HTTPException
 
+import httpx
+import openai
+from pymongo import errors as mongo_errors
+
+from core.config import settings
+from core.metrics import CIRCUIT_BREAKER_REJECTIONS, CIRCUIT_BREAKER_STATE, CIRCUIT_BREAKER_TRIPS
+
 class CircuitState(Enum):
     CLOSED = "closed"
     OPEN = "open"
     HALF_OPEN = "half_open"
 
+# Value of the circuit_breaker_state gauge for each state
+_STATE_GAUGE_VALUES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
+
+class CircuitOpenError(HTTPException):
+    """Raised instead of calling a dependency whose circuit is open"""
+    
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"Service temporarily unavailable due to high failure rate ({name})",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        self.name = name
+
+# Exceptions that mean the dependency itself is unhealthy. Anything else
+# (validation errors, 4xx HTTPExceptions, duplicate keys, bad requests) is
+# the caller's problem and must not open the circuit.
+_TRANSIENT_ERRORS: Tuple[type, ...] = (asyncio.TimeoutError, TimeoutError, ConnectionError)
+
+FAILURE_TYPES: Dict[str, Tuple[type, ...]] = {
+    "openai": _TRANSIENT_ERRORS + (
+        openai.APIConnectionError,  # includes APITimeoutError
+        openai.RateLimitError,
+        openai.InternalServerError,
+        httpx.TransportError
+    ),
+    "mongodb": _TRANSIENT_ERRORS + (
+        mongo_errors.ConnectionFailure,  # includes AutoReconnect, NetworkTimeout, ServerSelectionTimeoutError
+        mongo_errors.ExecutionTimeout,
+        mongo_errors.WTimeoutError
+    ),
+    "vector_store": _TRANSIENT_ERRORS + (OSError, sqlite3.OperationalError),
+}
+
+_ALL_FAILURE_TYPES: Tuple[type, ...] = tuple({t for types in FAILURE_TYPES.values() for t in types})
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether exc is a dependency outage worth retrying rather than a permanent failure"""
+    return isinstance(exc, (CircuitOpenError,) + _ALL_FAILURE_TYPES)
+
 class CircuitBreaker:
-    def __init__(self, failure_threshold: int = 5, timeout: int = 60):
+    """
+    Per-dependency circuit breaker. State is read without locks: every
+    transition happens between awaits on the event loop, so it is atomic.
+    Only exceptions classified by is_failure count towards opening; once the
+    timeout passes, at most half_open_max_probes requests probe the dependency.
+    """
+    
+    def __init__(
+        self,
+        name: str = "default",
+        failure_threshold: int = 5,
+        timeout: int = 60,
+        half_open_max_probes: int = 1,
+        is_failure: Optional[Callable[[BaseException], bool]] = None
+    ):
+        self.name = name
         self.failure_threshold = failure_threshold
         self.timeout = timeout
+        self.half_open_max_probes = half_open_max_probes
+        self.is_failure = is_failure or (lambda exc: isinstance(exc, _TRANSIENT_ERRORS))
+        self._set_state(CircuitState.CLOSED)
         self.failure_count = 0
         self.last_failure_time: Optional[float] = None
-        self.state = CircuitState.CLOSED
-        self.lock = asyncio.Lock()
+        self.probes_in_flight = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self.ignored_errors = 0
+    
+    def _set_state(self, state: CircuitState):
+        self.state = state
+        CIRCUIT_BREAKER_STATE.labels(breaker=self.name).set(_STATE_GAUGE_VALUES[state])
+    
+    def _reject(self, retry_after: float) -> CircuitOpenError:
+        self.rejected += 1
+        CIRCUIT_BREAKER_REJECTIONS.labels(breaker=self.name).inc()
+        return CircuitOpenError(self.name, retry_after)
     
-    async def _should_attempt_reset(self) -> bool:
-        """Check if circuit breaker should attempt reset"""
-        if self.state == CircuitState.OPEN and self.last_failure_time:
-            return time.time() - self.last_failure_time >= self.timeout
-        return False
+    def _open(self):
+        self._set_state(CircuitState.OPEN)
+        self.last_failure_time = time.monotonic()
+        self.times_opened += 1
+        CIRCUIT_BREAKER_TRIPS.labels(breaker=self.name).inc()
+    
+    def _admit(self) -> bool:
+        """Decide whether a request may proceed; returns True if it is a half-open probe"""
+        if self.state is CircuitState.CLOSED:
+            return False
+        
+        if self.state is CircuitState.OPEN:
+            elapsed = time.monotonic() - (self.last_failure_time or 0.0)
+            if elapsed < self.timeout:
+                raise self._reject(self.timeout - elapsed)
+            self._set_state(CircuitState.HALF_OPEN)
+        
+        if self.probes_in_flight >= self.half_open_max_probes:
+            raise self._reject(1)
+        self.probes_in_flight += 1
+        return True
     
     @asynccontextmanager
     async def call(self):
         """Circuit breaker context manager"""
-        async with self.lock:
-            if self.state == CircuitState.OPEN:
-                if await self._should_attempt_reset():
-                    self.state = CircuitState.HALF_OPEN
-                else:
-                    raise HTTPException(
-                        status_code=503,
-                        detail="Service temporarily unavailable due to high failure rate"
-                    )
-        
+        probe = self._admit()
         try:
             yield
-            # Success - reset failure count
-            async with self.lock:
-                self.failure_count = 0
-                if self.state == CircuitState.HALF_OPEN:
-                    self.state = CircuitState.CLOSED
         except Exception as e:
-            # Failure - increment count
-            async with self.lock:
-                self.failure_count += 1
-                self.last_failure_time = time.time()
-                
-                if self.failure_count >= self.failure_threshold:
-                    self.state = CircuitState.OPEN
+            if probe:
+                self.probes_in_flight -= 1
+            if not self.is_failure(e):
+                self.ignored_errors += 1
+                raise
+            self.failure_count += 1
+            self.last_failure_time = time.monotonic()
+            if self.state is not CircuitState.OPEN and (probe or self.failure_count >= self.failure_threshold):
+                self._open()
+            raise
+        except BaseException:
+            # Cancelled: no verdict on the dependency
+            if probe:
+                self.probes_in_flight -= 1
             raise
+        else:
+            if probe:
+                self.probes_in_flight -= 1
+                if self.state is CircuitState.HALF_OPEN:
+                    self._set_state(CircuitState.CLOSED)
+            self.failure_count = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "failure_count": self.failure_count,
+            "failure_threshold": self.failure_threshold,
+            "probes_in_flight": self.probes_in_flight,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "ignored_errors": self.ignored_errors,
+            "seconds_since_failure": (time.monotonic() - self.last_failure_time) if self.last_failure_time else None
+        }
+
+class CircuitBreakerRegistry:
+    """Breakers keyed by dependency and, when per_org is enabled, by org"""
+    
+    def __init__(self, failure_threshold: int = 5, timeout: int = 60, half_open_max_probes: int = 1, per_org: bool = False):
+        self.failure_threshold = failure_threshold
+        self.timeout = timeout
+        self.half_open_max_probes = half_open_max_probes
+        self.per_org = per_org
+        self._breakers: Dict[str, CircuitBreaker] = {}
+    
+    def get(self, dependency: str, org_id: Optional[str] = None) -> CircuitBreaker:
+        name = f"{dependency}:{org_id}" if self.per_org and org_id else dependency
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            failure_types = FAILURE_TYPES.get(dependency, _TRANSIENT_ERRORS)
+            breaker = self._breakers[name] = CircuitBreaker(
+                name=name,
+                failure_threshold=self.failure_threshold,
+                timeout=self.timeout,
+                half_open_max_probes=self.half_open_max_probes,
+                is_failure=lambda exc: isinstance(exc, failure_types)
+            )
+        return breaker
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: breaker.stats() for name, breaker in sorted(self._breakers.items())}
 
+# Global instance
+circuit_breakers = CircuitBreakerRegistry(
+    failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    timeout=settings.CIRCUIT_BREAKER_TIMEOUT_SECONDS,
+    half_open_max_probes=settings.CIRCUIT_BREAKER_HALF_OPEN_PROBES,
+    per_org=settings.CIRCUIT_BREAKER_PER_ORG
+)
@@ -1,6 +1,7 @@
 # core/config.py
 
 import os
+import tempfile
 from typing import Optional
 from dotenv import load_dotenv
 import logging
@@ -13,15 +14,84 @@ logger.debug(f"Environment variables loaded. OPENAI_API_KEY: {'set' if os.getenv
 class Settings:
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     OPENAI_MODEL: str = "gpt-4o"
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    OPENAI_KEEPALIVE_EXPIRY: float = 30.0
+    # Rate limit state: "local" (per process), "shared" (all workers on the host) or "mongo" (all hosts)
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "shared")
+    RATE_LIMIT_SHARED_PATH: str = os.getenv("RATE_LIMIT_SHARED_PATH", "")
+    RATE_LIMIT_SHARED_SLOTS: int = int(os.getenv("RATE_LIMIT_SHARED_SLOTS", "65536"))
+    # Logging: "json" or "text"; sampling is "logger.prefix=rate,..." for DEBUG/INFO records
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_SAMPLING: str = os.getenv("LOG_SAMPLING", "")
+    LOG_MAX_MESSAGE_LENGTH: int = int(os.getenv("LOG_MAX_MESSAGE_LENGTH", "4000"))
+    LOG_MAX_FIELD_LENGTH: int = int(os.getenv("LOG_MAX_FIELD_LENGTH", "1000"))
+    # Shared by all uvicorn workers so /metrics aggregates across them
+    PROMETHEUS_MULTIPROC_DIR: str = os.getenv("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "callcenter_metrics"))
+    # Circuit breakers per dependency (openai, mongodb, vector_store), optionally per org
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_BREAKER_TIMEOUT_SECONDS: int = int(os.getenv("CIRCUIT_BREAKER_TIMEOUT_SECONDS", "60"))
+    CIRCUIT_BREAKER_HALF_OPEN_PROBES: int = int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_PROBES", "1"))
+    CIRCUIT_BREAKER_PER_ORG: bool = os.getenv("CIRCUIT_BREAKER_PER_ORG", "false").lower() == "true"
+    VALIDATION_CACHE_SIZE: int = int(os.getenv("VALIDATION_CACHE_SIZE", "1000"))
+    VALIDATION_CACHE_TTL_SECONDS: float = float(os.getenv("VALIDATION_CACHE_TTL_SECONDS", "3600"))
+    # Cosine similarity bands for the local duplicate-question prefilter
+    DUPLICATE_QUESTION_THRESHOLD: float = float(os.getenv("DUPLICATE_QUESTION_THRESHOLD", "0.92"))
+    NOVEL_QUESTION_THRESHOLD: float = float(os.getenv("NOVEL_QUESTION_THRESHOLD", "0.70"))
+    DUPLICATE_QUESTION_CANDIDATES: int = int(os.getenv("DUPLICATE_QUESTION_CANDIDATES", "5"))
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "callcenter_rag")
+    # Index reconciliation at startup (see core/indexes.py)
+    MONGO_DROP_STALE_INDEXES: bool = os.getenv("MONGO_DROP_STALE_INDEXES", "false").lower() == "true"
+    MONGO_VERIFY_INDEXES: bool = os.getenv("MONGO_VERIFY_INDEXES", "false").lower() == "true"
     CHROMADB_PATH: str = os.getenv("CHROMADB_PATH", "./vector_db")
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "memory")  # "memory" or "chroma"
+    VECTOR_MEMORY_TTL_SECONDS: int = 3600
+    # Background reclamation of deleted Chroma collections and segment folders
+    VECTOR_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("VECTOR_SWEEP_INTERVAL_SECONDS", "300"))
+    VECTOR_SWEEP_IDLE_SECONDS: float = float(os.getenv("VECTOR_SWEEP_IDLE_SECONDS", "30"))
+    VECTOR_ORPHAN_GRACE_SECONDS: float = float(os.getenv("VECTOR_ORPHAN_GRACE_SECONDS", "300"))
+    
+    # Background job settings
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))  # consumers per uvicorn worker
+    JOB_POLL_INTERVAL_SECONDS: float = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0"))
+    JOB_LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    CALL_LEASE_SECONDS: int = 120
+    CALL_LEASE_POLL_SECONDS: float = 1.0
+    CALL_LEASE_WAIT_SECONDS: float = 900.0
+    
+    # Bulk processing pipeline settings
+    BULK_QUEUE_SIZE: int = 32  # items buffered between stages
+    BULK_FETCH_BATCH_SIZE: int = 100
+    BULK_EMBED_BATCH_CALLS: int = 8
+    BULK_LLM_CONCURRENCY: int = int(os.getenv("BULK_LLM_CONCURRENCY", "8"))  # calls extracted at once
+    BULK_WRITE_BATCH_CALLS: int = 50
     
     # RAG settings
-    CHUNK_SIZE: int = 2000
-    CHUNK_OVERLAP: int = 200
+    # Chunk budgets are in embedding-tokenizer tokens; all-MiniLM-L6-v2 truncates at 256
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
     TOP_K_RESULTS: int = 5
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_WORKERS: int = int(os.getenv("EMBEDDING_WORKERS", "1"))  # 0 encodes in a thread instead
+    # all-MiniLM-L6-v2; used for empty results until the embedding workers report the model's own
+    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "384"))
+    EMBEDDING_MICROBATCH_ENABLED: bool = os.getenv("EMBEDDING_MICROBATCH_ENABLED", "true").lower() == "true"
+    EMBEDDING_BATCH_WINDOW_MS: float = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    EMBEDDING_MAX_BATCH_SIZE: int = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))  # in-memory entries, 0 disables
+    EMBEDDING_CACHE_DISK_PATH: Optional[str] = os.getenv("EMBEDDING_CACHE_DISK_PATH")  # unset disables the disk tier
+    EMBEDDING_CACHE_DISK_CAPACITY: int = int(os.getenv("EMBEDDING_CACHE_DISK_CAPACITY", "200000"))
+
+    # QA extraction settings
+    QA_EXTRACTION_MODE: str = os.getenv("QA_EXTRACTION_MODE", "batched")  # "batched" or "per_question"
+    QA_BATCH_SIZE: int = int(os.getenv("QA_BATCH_SIZE", "10"))
+    QA_EXTRACTION_CONCURRENCY: int = int(os.getenv("QA_EXTRACTION_CONCURRENCY", "8"))
+    # Prompt context budgets in model tokens (capped by the model's context window)
+    QA_CONTEXT_TOKENS: int = int(os.getenv("QA_CONTEXT_TOKENS", "1000"))
+    QA_BATCH_CONTEXT_TOKENS: int = int(os.getenv("QA_BATCH_CONTEXT_TOKENS", "3000"))
 
 settings = Settings()
 logger.debug(f"Settings initialized: DATABASE_NAME={settings.DATABASE_NAME}, MONGODB_URL={settings.MONGODB_URL}")
@@ -2,8 +2,9 @@
 
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import ASCENDING, DESCENDING
 from core.config import settings
+from core.indexes import reconcile_indexes, verify_indexes
+from core.leases import MongoLease
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,9 @@ class MongoDB:
 
 db = MongoDB()
 
+INDEX_RECONCILE_LEASE = "index_reconcile"
+INDEX_RECONCILE_LEASE_SECONDS = 600  # index builds on large collections can be slow
+
 async def get_database():
     if db.database is None:
         logger.error("Database not initialized")
@@ -32,7 +36,7 @@ async def init_database():
         logger.info("Successfully connected to MongoDB")
         
         # Create collections explicitly
-        collections = ['questions','qa_pairs']
+        collections = ['questions','qa_pairs','processing_jobs','leases','rate_limits']
 
         existing_collections = await db.database.list_collection_names()
         for collection_name in collections:
@@ -50,18 +54,23 @@ async def init_database():
         raise
 
 async def create_indexes():
-    """Create database indexes for better performance"""
+    """
+    Reconcile indexes with the query shapes declared in core.indexes.
+    Every uvicorn worker starts at once; one of them, holding a lease, does the work.
+    """
     try:
-        # Questions collection indexes  
-        await db.database.questions.create_index([("org_id", 1)], background=True)
-        await db.database.questions.create_index([("org_id", 1), ("question_text", "text")], background=True)
-        await db.database.questions.create_index([("created_at", DESCENDING)], background=True)
-
-        # QA pairs collection indexes
-        await db.database.qa_pairs.create_index([("conv_id", 1)], background=True)
-        await db.database.qa_pairs.create_index([("created_at", DESCENDING)], background=True)
-        
-        logger.info("Database indexes created successfully")
+        lease = MongoLease(db.database)
+        token = await lease.acquire(INDEX_RECONCILE_LEASE, INDEX_RECONCILE_LEASE_SECONDS)
+        if not token:
+            logger.info("Another worker is reconciling database indexes")
+            return
+        try:
+            await reconcile_indexes(db.database, drop_stale=settings.MONGO_DROP_STALE_INDEXES)
+            if settings.MONGO_VERIFY_INDEXES:
+                await verify_indexes(db.database)
+        finally:
+            await lease.release(INDEX_RECONCILE_LEASE, token)
+        logger.info("Database indexes reconciled successfully")
         
     except Exception as e:
         logger.error(f"Failed to create indexes: {str(e)}", exc_info=True)
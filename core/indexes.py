@@ -0,0 +1,196 @@
+# core/indexes.py
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# IndexNotFound, IndexOptionsConflict, IndexKeySpecsConflict: another worker
+# reconciling at the same time got to the index first
+_CONCURRENT_CHANGE_CODES = {27, 85, 86}
+
+# Stages that mean a query is not served by an index
+COLLSCAN = "COLLSCAN"
+BLOCKING_SORT = "SORT"
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """An index some query shape needs, named the way MongoDB names it by default"""
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    options: Dict[str, Any] = field(default_factory=dict, hash=False, compare=False)
+
+    @property
+    def name(self) -> str:
+        return "_".join(f"{key}_{direction}" for key, direction in self.keys)
+
+@dataclass(frozen=True)
+class QueryShape:
+    """A query the services issue, with sample values so it can be explained"""
+    name: str
+    collection: str
+    filter: Dict[str, Any] = field(hash=False, compare=False)
+    sort: Optional[Tuple[Tuple[str, int], ...]] = None
+
+INDEXES: List[IndexSpec] = [
+    # Question lists per org (validation, extraction, bulk pipeline)
+    IndexSpec("questions", (("org_id", ASCENDING),)),
+    # get_qa_pairs and the paginated read, both newest first
+    IndexSpec("qa_pairs", (("conv_id", ASCENDING), ("org_id", ASCENDING), ("createdAt", DESCENDING))),
+    IndexSpec("qa_pairs", (("conv_id", ASCENDING), ("createdAt", DESCENDING))),
+    # Call records are looked up and updated by call_sid
+    IndexSpec("Call", (("call_sid", ASCENDING),)),
+    IndexSpec("AICallLog", (("call_sid", ASCENDING),)),
+    IndexSpec("organizations", (("org_id", ASCENDING), ("is_active", ASCENDING))),
+    # Job claim (oldest first per status)
+    IndexSpec("processing_jobs", (("status", ASCENDING), ("created_at", ASCENDING))),
+    # At most one pending or running job per call; also serves the active-job check on enqueue
+    IndexSpec("processing_jobs", (("call_sid", ASCENDING),),
+              {"unique": True, "partialFilterExpression": {"active": True}}),
+    # Leases and rate limit buckets expire on their own once expires_at has passed
+    IndexSpec("leases", (("expires_at", ASCENDING),), {"expireAfterSeconds": 0}),
+    IndexSpec("rate_limits", (("expires_at", ASCENDING),), {"expireAfterSeconds": 0}),
+]
+
+_SAMPLE_ID = ObjectId()
+_SAMPLE_TIME = datetime(2000, 1, 1)
+
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("questions_by_org", "questions", {"org_id": "org"}),
+    QueryShape("question_by_id", "questions", {"_id": _SAMPLE_ID, "org_id": "org"}),
+    QueryShape("other_questions_by_org", "questions", {"org_id": "org", "_id": {"$ne": _SAMPLE_ID}}),
+    QueryShape("qa_pairs_by_conversation_and_org", "qa_pairs",
+               {"conv_id": "call", "org_id": _SAMPLE_ID}, (("createdAt", DESCENDING),)),
+    QueryShape("qa_pairs_page", "qa_pairs", {"conv_id": "call"}, (("createdAt", DESCENDING),)),
+    QueryShape("qa_pairs_by_conversations", "qa_pairs", {"conv_id": {"$in": ["call", "other"]}}),
+    QueryShape("call_by_sid", "Call", {"call_sid": "call"}),
+    QueryShape("calls_by_sid", "Call", {"call_sid": {"$in": ["call", "other"]}}),
+    QueryShape("ai_call_log_by_sid", "AICallLog", {"call_sid": "call"}),
+    QueryShape("ai_call_logs_by_sid", "AICallLog", {"call_sid": {"$in": ["call", "other"]}}),
+    QueryShape("organization_by_id", "organizations", {"_id": _SAMPLE_ID}),
+    QueryShape("active_organization", "organizations", {"org_id": "org", "is_active": True}),
+    QueryShape("active_job_for_call", "processing_jobs", {"call_sid": "call", "active": True}),
+    QueryShape("claim_job", "processing_jobs",
+               {"$or": [
+                   {"status": "pending", "available_at": {"$lte": _SAMPLE_TIME}},
+                   {"status": "in_progress", "lease_expires_at": {"$lt": _SAMPLE_TIME}, "attempts": {"$lt": 3}}
+               ]},
+               (("created_at", ASCENDING),)),
+    QueryShape("abandoned_jobs", "processing_jobs",
+               {"status": "in_progress", "lease_expires_at": {"$lt": _SAMPLE_TIME}, "attempts": {"$gte": 3}}),
+    QueryShape("lease_by_name", "leases", {"_id": "lease", "owner": "owner"}),
+    QueryShape("rate_limit_bucket", "rate_limits", {"_id": "key"}),
+]
+
+def _key_tuple(key_spec) -> Tuple[Tuple[str, Any], ...]:
+    # Servers may report directions as floats; text and hashed keys stay strings
+    return tuple((name, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for name, direction in key_spec.items())
+
+async def _tolerating_races(operation, description: str):
+    try:
+        await operation
+    except OperationFailure as e:
+        if e.code not in _CONCURRENT_CHANGE_CODES:
+            raise
+        logger.info(f"Skipped {description}, changed concurrently: {e}")
+
+def _options_match(spec: IndexSpec, existing: Dict[str, Any]) -> bool:
+    return all(existing.get(option) == value for option, value in spec.options.items())
+
+async def reconcile_indexes(database, drop_stale: bool = False,
+                            specs: List[IndexSpec] = INDEXES) -> Dict[str, List[str]]:
+    """
+    Create every declared index that is missing.
+    An index with the declared keys but different options is rebuilt. Indexes
+    no spec declares are reported, and dropped only when drop_stale is set.
+    Safe to run from several workers at once: drops and creates another
+    worker already made are skipped.
+    """
+    report = {"created": [], "rebuilt": [], "stale": [], "dropped": []}
+    by_collection: Dict[str, List[IndexSpec]] = {}
+    for spec in specs:
+        by_collection.setdefault(spec.collection, []).append(spec)
+
+    for collection_name, collection_specs in by_collection.items():
+        collection = database[collection_name]
+        existing = {}
+        async for index in collection.list_indexes():
+            existing[_key_tuple(index["key"])] = index
+
+        for spec in collection_specs:
+            current = existing.pop(spec.keys, None)
+            if current is not None and _options_match(spec, current):
+                continue
+            qualified = f"{collection_name}.{spec.name}"
+            if current is not None:
+                await _tolerating_races(collection.drop_index(current["name"]), f"drop of {qualified}")
+                report["rebuilt"].append(qualified)
+            else:
+                report["created"].append(qualified)
+            await _tolerating_races(
+                collection.create_index(list(spec.keys), name=spec.name, **spec.options), f"creation of {qualified}"
+            )
+
+        for keys, index in existing.items():
+            if index["name"] == "_id_":
+                continue
+            qualified = f"{collection_name}.{index['name']}"
+            report["stale"].append(qualified)
+            if drop_stale:
+                await _tolerating_races(collection.drop_index(index["name"]), f"drop of {qualified}")
+                report["dropped"].append(qualified)
+
+    for action in ("created", "rebuilt", "dropped"):
+        if report[action]:
+            logger.info(f"Indexes {action}: {', '.join(report[action])}")
+    if report["stale"] and not drop_stale:
+        logger.warning(f"Indexes not declared by any query shape: {', '.join(report['stale'])}")
+    return report
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Every stage name in an explain plan tree"""
+    stages = []
+    pending = [plan]
+    while pending:
+        node = pending.pop()
+        if "stage" in node:
+            stages.append(node["stage"])
+        if "inputStage" in node:
+            pending.append(node["inputStage"])
+        pending.extend(node.get("inputStages", []))
+    return stages
+
+def _winning_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+    # Slot-based engine plans nest the classic-style tree under queryPlan
+    return winning.get("queryPlan", winning)
+
+async def verify_indexes(database, shapes: List[QueryShape] = QUERY_SHAPES) -> List[Dict[str, Any]]:
+    """
+    Explain each registered query shape and flag collection scans and in-memory sorts.
+    Returns one entry per shape with its plan stages and any problems found.
+    """
+    results = []
+    for shape in shapes:
+        cursor = database[shape.collection].find(shape.filter)
+        if shape.sort:
+            cursor = cursor.sort(list(shape.sort))
+        explain = await cursor.explain()
+        stages = _plan_stages(_winning_plan(explain))
+        problems = [stage for stage in (COLLSCAN, BLOCKING_SORT) if stage in stages]
+        results.append({
+            "query": shape.name,
+            "collection": shape.collection,
+            "stages": stages,
+            "problems": problems,
+        })
+        if problems:
+            logger.warning(f"Query {shape.name} on {shape.collection} uses {', '.join(problems)}: {stages}")
+    return results
@@ -0,0 +1,49 @@
+# core/leases.py
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Prefix of this process's owner tokens, to tell holders apart when debugging
+PROCESS_OWNER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+class MongoLease:
+    """
+    Named, expiring locks shared by every worker through a MongoDB collection.
+    A lease is held while its document exists with an unexpired expires_at;
+    a TTL index on expires_at removes abandoned ones. Every acquisition gets
+    its own owner token, so two holders in one process never share a lease.
+    """
+    
+    def __init__(self, db, collection_name: str = "leases"):
+        self.collection = db[collection_name]
+    
+    async def acquire(self, name: str, ttl_seconds: int) -> Optional[str]:
+        """Take the lease if it is free or expired; returns the owner token, or None if it is held"""
+        now = datetime.utcnow()
+        token = f"{PROCESS_OWNER_ID}:{uuid.uuid4().hex}"
+        try:
+            await self.collection.update_one(
+                {"_id": name, "expires_at": {"$lt": now}},
+                {"$set": {"owner": token, "expires_at": now + timedelta(seconds=ttl_seconds), "acquired_at": now}},
+                upsert=True
+            )
+            return token
+        except DuplicateKeyError:
+            # The upsert collided with a live lease held by someone else
+            return None
+    
+    async def renew(self, name: str, token: str, ttl_seconds: int) -> bool:
+        result = await self.collection.update_one(
+            {"_id": name, "owner": token},
+            {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds)}}
+        )
+        return result.matched_count == 1
+    
+    async def release(self, name: str, token: str):
+        await self.collection.delete_one({"_id": name, "owner": token})
@@ -0,0 +1,136 @@
+# core/logging_config.py
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from core.config import settings
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+def truncate(value: Any, max_length: int) -> Any:
+    """Cap strings (and the repr of other large values) at max_length characters"""
+    if not isinstance(value, (str, int, float, bool, type(None))):
+        value = repr(value)
+    if isinstance(value, str) and len(value) > max_length:
+        return f"{value[:max_length]}... [truncated {len(value) - max_length} chars]"
+    return value
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Parse "services.rag_services=0.1,api=0.5" into {logger prefix: keep rate}"""
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.strip().partition("=")
+        if name and rate:
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+class SamplingTruncationFilter(logging.Filter):
+    """
+    Runs on the caller's thread before a record is queued: keeps only a
+    sampled fraction of DEBUG/INFO records per logger prefix (warnings and
+    errors are always kept) and caps the message and extra fields so large
+    payloads are never copied into the queue.
+    """
+    
+    def __init__(self, sampling: Dict[str, float], max_message_length: int, max_field_length: int):
+        super().__init__()
+        # Longest prefix first so "services.rag_services" beats "services"
+        self.sampling = sorted(sampling.items(), key=lambda item: -len(item[0]))
+        self.max_message_length = max_message_length
+        self.max_field_length = max_field_length
+    
+    def _keep_rate(self, name: str) -> float:
+        for prefix, rate in self.sampling:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and self.sampling:
+            rate = self._keep_rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        
+        record.msg = truncate(record.getMessage(), self.max_message_length)
+        record.args = None
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                setattr(record, key, truncate(value, self.max_field_length))
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and extra fields"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        elif record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the traceback now (the exc_info objects can't be used later), but leave
+        # the rest of the record intact for the formatter on the listener thread
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging():
+    """
+    Route all logging through a queue drained by a background thread, so
+    request handlers never block on stdout. Idempotent.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(SamplingTruncationFilter(
+        parse_sampling(settings.LOG_SAMPLING),
+        settings.LOG_MAX_MESSAGE_LENGTH,
+        settings.LOG_MAX_FIELD_LENGTH
+    ))
+    
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Flush queued records and stop the background thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,91 @@
+# core/metrics.py
+import contextvars
+import glob
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Optional, Tuple
+
+from core.config import settings
+
+# prometheus_client picks its storage when first imported: point every worker
+# at the same directory so /metrics aggregates all uvicorn workers
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.PROMETHEUS_MULTIPROC_DIR)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# Org whose work is running in the current task, for per-org LLM accounting
+current_org_id: contextvars.ContextVar[str] = contextvars.ContextVar("current_org_id", default="unknown")
+
+STAGE_DURATION = Histogram(
+    "qa_stage_duration_seconds",
+    "Time spent in each QA pipeline stage",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+LLM_REQUESTS = Counter("llm_requests_total", "OpenAI chat completion calls", ["org_id", "model", "outcome"])
+LLM_TOKENS = Counter("llm_tokens_total", "OpenAI tokens used", ["org_id", "model", "kind"])
+LLM_IN_FLIGHT = Gauge("llm_requests_in_flight", "OpenAI calls awaiting a response", multiprocess_mode="livesum")
+JOBS_IN_FLIGHT = Gauge("qa_jobs_in_flight", "Conversations being processed", ["source"], multiprocess_mode="livesum")
+HTTP_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+# Breakers are per worker; across workers the worst state wins (0 closed, 1 half-open, 2 open)
+CIRCUIT_BREAKER_STATE = Gauge("circuit_breaker_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open",
+                              ["breaker"], multiprocess_mode="livemax")
+CIRCUIT_BREAKER_TRIPS = Counter("circuit_breaker_trips_total", "Times a circuit breaker opened", ["breaker"])
+CIRCUIT_BREAKER_REJECTIONS = Counter("circuit_breaker_rejections_total", "Calls refused by an open circuit breaker",
+                                     ["breaker"])
+
+@contextmanager
+def observe_stage(stage: str):
+    """Record the duration of a pipeline stage, whether or not it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(stage=stage).observe(time.perf_counter() - start)
+
+def record_llm_call(model: str, outcome: str, usage: Optional[Any] = None):
+    """Count an LLM call and its prompt/completion tokens against the current org"""
+    org_id = current_org_id.get()
+    LLM_REQUESTS.labels(org_id=org_id, model=model, outcome=outcome).inc()
+    if usage is not None:
+        LLM_TOKENS.labels(org_id=org_id, model=model, kind="prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        LLM_TOKENS.labels(org_id=org_id, model=model, kind="completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Prometheus exposition of every worker's metrics"""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_worker_stopped():
+    """Drop this worker's live gauges from the aggregate"""
+    multiprocess.mark_process_dead(os.getpid())
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def reap_dead_workers():
+    """Drop live gauges of workers that died without shutting down, e.g. killed and respawned"""
+    for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "gauge_live*_*.db")):
+        pid = os.path.basename(path)[:-len(".db")].rsplit("_", 1)[-1]
+        if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+            multiprocess.mark_process_dead(int(pid))
+
+def reset_metrics_directory():
+    """Clear samples left by a previous run; call once before workers start"""
+    for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.remove(path)
+
+if __name__ == "__main__":
+    # Container entrypoint: python -m core.metrics --reset, before uvicorn forks its workers
+    import sys
+    if "--reset" in sys.argv[1:]:
+        reset_metrics_directory()
@@ -0,0 +1,248 @@
+# core/rate_limit_stores.py
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; SharedMemoryBucketStore needs it
+    fcntl = None
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+class LocalBucketStore:
+    """Token buckets in a process-local dict: [tokens, last_refill] per key"""
+    
+    shared = False
+    # Whether evict_idle and stats walk enough state to belong in a worker thread
+    blocking_scans = False
+    
+    def __init__(self):
+        self.buckets: Dict[str, List[float]] = {}
+    
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [capacity, now]
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+            bucket[1] = now
+        
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return True, 0.0
+        return False, (1.0 - bucket[0]) / refill_per_second
+    
+    def evict_idle(self, capacity: float, refill_per_second: float) -> int:
+        now = time.monotonic()
+        idle = [key for key, (tokens, last) in self.buckets.items()
+                if tokens + (now - last) * refill_per_second >= capacity]
+        for key in idle:
+            del self.buckets[key]
+        return len(idle)
+    
+    def stats(self) -> Dict[str, Any]:
+        memory = sys.getsizeof(self.buckets) + sum(
+            sys.getsizeof(key) + sys.getsizeof(bucket) + 2 * sys.getsizeof(0.0)
+            for key, bucket in self.buckets.items()
+        )
+        return {"backend": "local", "keys": len(self.buckets), "approx_memory_bytes": memory}
+
+class SharedMemoryBucketStore:
+    """
+    Token buckets shared by every worker process on the host through a
+    memory-mapped, fixed-size hash table. The table is split into stripes of
+    STRIPE_SLOTS slots; a key hashes to one stripe and probes only inside it,
+    and each update holds an fcntl byte-range lock on just that stripe.
+    When a stripe is full the idlest bucket is recycled, which is safe because
+    a refilled bucket behaves exactly like an unseen key.
+    """
+    
+    shared = True
+    blocking_scans = True
+    MAGIC = b"RLB1"
+    HEADER = struct.Struct("<4sI")
+    SLOT = struct.Struct("<Qdd")  # key hash (0 = empty), tokens, last refill (wall clock)
+    STRIPE_SLOTS = 64
+    
+    def __init__(self, path: str, slots: int):
+        if fcntl is None:
+            raise RuntimeError("Shared rate limit state requires fcntl (POSIX)")
+        self.path = path
+        self.stripes = max(1, slots // self.STRIPE_SLOTS)
+        self.slots = self.stripes * self.STRIPE_SLOTS
+        self.size = self.HEADER.size + self.slots * self.SLOT.size
+        # lockf locks are per process; this keeps the scanning thread and the event loop apart
+        self._thread_lock = threading.Lock()
+        
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, self.HEADER.size, 0)
+            if os.fstat(self._fd).st_size != self.size or header != self.HEADER.pack(self.MAGIC, self.slots):
+                # First worker (or a resized table): start from an empty table
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, self.slots), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, self.size)
+    
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+    
+    def _stripe_range(self, stripe: int) -> Tuple[int, int]:
+        start = self.HEADER.size + stripe * self.STRIPE_SLOTS * self.SLOT.size
+        return start, self.STRIPE_SLOTS * self.SLOT.size
+    
+    def _lock(self, stripe: int, operation: int):
+        start, length = self._stripe_range(stripe)
+        fcntl.lockf(self._fd, operation, length, start, os.SEEK_SET)
+    
+    @contextmanager
+    def _locked(self, stripe: int):
+        """Hold one stripe against other processes and other threads of this one"""
+        with self._thread_lock:
+            self._lock(stripe, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                self._lock(stripe, fcntl.LOCK_UN)
+    
+    def _take_locked(self, key_hash: int, stripe: int, capacity: float, refill_per_second: float, now: float) -> Tuple[bool, float]:
+        start, _ = self._stripe_range(stripe)
+        home = key_hash % self.STRIPE_SLOTS
+        target = empty = None
+        idlest, idlest_level = None, -1.0
+        for probe in range(self.STRIPE_SLOTS):
+            offset = start + ((home + probe) % self.STRIPE_SLOTS) * self.SLOT.size
+            slot_hash, tokens, last = self.SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                target = offset
+                break
+            if slot_hash == 0:
+                if empty is None:
+                    empty = offset
+                continue
+            level = tokens + (now - last) * refill_per_second
+            if level > idlest_level:
+                idlest, idlest_level = offset, level
+        
+        if target is None:
+            target = empty if empty is not None else idlest
+            tokens = capacity
+        else:
+            _, tokens, last = self.SLOT.unpack_from(self._map, target)
+            tokens = min(capacity, tokens + max(0.0, now - last) * refill_per_second)
+        
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+        self.SLOT.pack_into(self._map, target, key_hash, tokens, now)
+        return allowed, 0.0 if allowed else (1.0 - tokens) / refill_per_second
+    
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> Tuple[bool, float]:
+        key_hash = self._hash(key)
+        stripe = (key_hash >> 32) % self.stripes
+        # Inlined rather than _locked(): this is the per-request path
+        with self._thread_lock:
+            self._lock(stripe, fcntl.LOCK_EX)
+            try:
+                return self._take_locked(key_hash, stripe, capacity, refill_per_second, time.time())
+            finally:
+                self._lock(stripe, fcntl.LOCK_UN)
+    
+    def evict_idle(self, capacity: float, refill_per_second: float) -> int:
+        """Walks the whole table; run it in a worker thread"""
+        evicted = 0
+        empty = self.SLOT.pack(0, 0.0, 0.0)
+        for stripe in range(self.stripes):
+            start, _ = self._stripe_range(stripe)
+            with self._locked(stripe):
+                now = time.time()
+                for index in range(self.STRIPE_SLOTS):
+                    offset = start + index * self.SLOT.size
+                    slot_hash, tokens, last = self.SLOT.unpack_from(self._map, offset)
+                    if slot_hash and tokens + (now - last) * refill_per_second >= capacity:
+                        self._map[offset:offset + self.SLOT.size] = empty
+                        evicted += 1
+        return evicted
+    
+    def stats(self) -> Dict[str, Any]:
+        """Walks the whole table without locking (the key count is approximate); run it in a worker thread"""
+        keys = sum(
+            1 for index in range(self.slots)
+            if self.SLOT.unpack_from(self._map, self.HEADER.size + index * self.SLOT.size)[0]
+        )
+        return {"backend": "shared", "path": self.path, "keys": keys, "slots": self.slots, "approx_memory_bytes": self.size}
+    
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+class MongoBucketStore:
+    """
+    Token buckets in a MongoDB collection for limits enforced across hosts.
+    Each check is one atomic pipeline update evaluated with the server clock;
+    a TTL index on expires_at removes buckets once they would have refilled.
+    """
+    
+    shared = True
+    blocking_scans = False
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    def _pipeline(self, capacity: float, refill_per_second: float) -> List[Dict[str, Any]]:
+        elapsed_seconds = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        return [
+            {"$set": {
+                "tokens": {"$min": [capacity, {"$add": [
+                    {"$ifNull": ["$tokens", capacity]},
+                    {"$multiply": [elapsed_seconds, refill_per_second]}
+                ]}]},
+                "updated_at": "$$NOW",
+                "expires_at": {"$add": ["$$NOW", int(capacity / refill_per_second * 1000)]}
+            }},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}}
+        ]
+    
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> Tuple[bool, float]:
+        pipeline = self._pipeline(capacity, refill_per_second)
+        try:
+            bucket = await self.collection.find_one_and_update(
+                {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker created the bucket concurrently; it exists now
+            bucket = await self.collection.find_one_and_update(
+                {"_id": key}, pipeline, return_document=ReturnDocument.AFTER
+            )
+        if bucket["allowed"]:
+            return True, 0.0
+        return False, (1.0 - bucket["tokens"]) / refill_per_second
+    
+    def evict_idle(self, capacity: float, refill_per_second: float) -> int:
+        return 0  # handled by the TTL index
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "mongo", "collection": self.collection.name}
+
+def default_shared_path() -> str:
+    """Prefer tmpfs so the table never touches disk"""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "callcenter_rate_limits")
@@ -1,41 +1,106 @@
 # core/rate_limiter.py
 import asyncio
-import time
-from collections import defaultdict, deque
+import logging
+import math
 from contextlib import asynccontextmanager
-from typing import Dict, Deque
+from typing import Any, Dict, Optional
 from fastapi import HTTPException
 
+from core.config import settings
+from core.rate_limit_stores import LocalBucketStore, MongoBucketStore, SharedMemoryBucketStore, default_shared_path
+
+logger = logging.getLogger(__name__)
+
 class RateLimiter:
-    def __init__(self, requests_per_minute: int = 100):
+    """
+    Token-bucket limiter: each key is refilled at requests_per_minute / 60
+    tokens per second up to a burst of requests_per_minute. Bucket state lives
+    in a store selected by settings.RATE_LIMIT_BACKEND:
+      - "local":  per-process dict (limits multiply with uvicorn workers)
+      - "shared": memory-mapped table shared by all workers on the host
+      - "mongo":  MongoDB collection shared across hosts, configured in start()
+    Keys whose bucket has refilled completely are evicted by a background task.
+    """
+    
+    def __init__(self, requests_per_minute: int = 100, eviction_interval: float = 60.0, backend: Optional[str] = None):
         self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, Deque[float]] = defaultdict(deque)
-        self.lock = asyncio.Lock()
+        self.capacity = float(requests_per_minute)
+        self.refill_per_second = requests_per_minute / 60.0
+        self.eviction_interval = eviction_interval
+        self.backend = backend or settings.RATE_LIMIT_BACKEND
+        self.store = self._create_store()
+        self._eviction_task: Optional[asyncio.Task] = None
+        self._allowed = 0
+        self._rejected = 0
+        self._evicted = 0
     
-    async def _cleanup_old_requests(self, key: str, now: float):
-        """Remove requests older than 1 minute"""
-        window_start = now - 60.0
-        while self.requests[key] and self.requests[key][0] < window_start:
-            self.requests[key].popleft()
+    def _create_store(self):
+        if self.backend == "shared":
+            try:
+                return SharedMemoryBucketStore(settings.RATE_LIMIT_SHARED_PATH or default_shared_path(),
+                                               settings.RATE_LIMIT_SHARED_SLOTS)
+            except Exception as e:
+                logger.warning(f"Shared rate limit state unavailable, limiting per process: {e}")
+        elif self.backend not in ("local", "mongo"):
+            raise ValueError(f"Unknown rate limit backend: {self.backend}")
+        # mongo swaps in its store once the database is available
+        return LocalBucketStore()
     
     @asynccontextmanager
     async def acquire(self, key: str):
         """Rate limit based on key (e.g., user_id, org_id, etc.)"""
-        async with self.lock:
-            now = time.time()
-            await self._cleanup_old_requests(key, now)
-            
-            if len(self.requests[key]) >= self.requests_per_minute:
-                raise HTTPException(
-                    status_code=429,
-                    detail=f"Rate limit exceeded. Max {self.requests_per_minute} requests per minute."
-                )
-            
-            self.requests[key].append(now)
-        
-        try:
-            yield
-        finally:
-            pass  # Cleanup happens in next request
-
-
+        allowed, retry_after = await self.store.take(key, self.capacity, self.refill_per_second)
+        if not allowed:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded. Max {self.requests_per_minute} requests per minute.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+        self._allowed += 1
+        yield
+    
+    async def _scan(self, method, *args):
+        """Run a store scan, in a worker thread when it walks a large table"""
+        if self.store.blocking_scans:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+    
+    async def evict_idle(self) -> int:
+        """Drop buckets that have refilled to capacity; they behave like new keys"""
+        evicted = await self._scan(self.store.evict_idle, self.capacity, self.refill_per_second)
+        self._evicted += evicted
+        return evicted
+    
+    async def _evict_periodically(self):
+        while True:
+            await asyncio.sleep(self.eviction_interval)
+            try:
+                evicted = await self.evict_idle()
+                if evicted:
+                    logger.debug(f"Evicted {evicted} idle rate limit keys")
+            except Exception as e:
+                logger.error(f"Rate limit eviction failed: {e}")
+    
+    def start(self, db=None):
+        """Start idle-key eviction (and the Mongo store when configured); call from a running event loop"""
+        if self.backend == "mongo" and db is not None and not isinstance(self.store, MongoBucketStore):
+            self.store = MongoBucketStore(db.rate_limits)
+        if self._eviction_task is None:
+            self._eviction_task = asyncio.create_task(self._evict_periodically())
+    
+    async def stop(self):
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            await asyncio.gather(self._eviction_task, return_exceptions=True)
+            self._eviction_task = None
+    
+    async def stats(self) -> Dict[str, Any]:
+        """Key count and approximate memory held by bucket state"""
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            **(await self._scan(self.store.stats)),
+            "allowed": self._allowed,
+            "rejected": self._rejected,
+            "evicted": self._evicted
+        }
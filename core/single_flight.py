@@ -0,0 +1,55 @@
+# core/single_flight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight computation"""
+    
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn for key, or wait for the result of the call already running for it"""
+        if not self.begin(key):
+            return await self.join(key)
+        
+        try:
+            result = await fn()
+            self.finish(key, result=result)
+            return result
+        except asyncio.CancelledError:
+            future = self._calls.pop(key, None)
+            if future is not None:
+                future.cancel()
+            raise
+        except Exception as e:
+            self.finish(key, error=e)
+            raise
+    
+    def begin(self, key: str) -> bool:
+        """Mark key as in flight for work driven outside do(); False if it already is"""
+        if key in self._calls:
+            return False
+        future = asyncio.get_running_loop().create_future()
+        # Mark the outcome as retrieved even when nobody else was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = future
+        return True
+    
+    def finish(self, key: str, result: Any = None, error: Optional[BaseException] = None):
+        """Hand the outcome of a begun key to everyone waiting on it"""
+        future = self._calls.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    def join(self, key: str) -> Optional[Awaitable[Any]]:
+        """Awaitable result of the call in flight for key, or None if there is none"""
+        in_flight = self._calls.get(key)
+        return asyncio.shield(in_flight) if in_flight is not None else None
+    
+    def in_flight(self) -> int:
+        return len(self._calls)
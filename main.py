@@ -1,38 +1,59 @@
 # main.py - UPDATED VERSION
+import atexit
 import logging
 import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 import time
 import os
 
-from api.endpoints import router
-from core.database import init_database, close_database
-from services.embedding_service import global_embedding_service
+from api.endpoints import router, rate_limiter
+from core.database import init_database, close_database, db
+from core.logging_config import configure_logging
+from core.metrics import HTTP_DURATION, mark_worker_stopped, reap_dead_workers, render_metrics, reset_metrics_directory
+from services.embedding_service import global_embedding_service, embedding_batcher, embedding_cache
+from services.embedding_executor import embedding_executor
+from services.container import ServiceContainer
+from services.job_queue import job_queue
+from services.vector_sweeper import vector_sweeper
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging: JSON records written by a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting application...")
+    # Also covers workers that exit without running shutdown; reap ones that were killed
+    atexit.register(mark_worker_stopped)
+    reap_dead_workers()
     try:
         # Initialize database first
         await init_database()
         
-        # Initialize global embedding model
-        logger.info("Initializing global embedding model...")
-        global_embedding_service  # This will trigger model loading
-        logger.info("Global embedding model initialized successfully")
+        # Start embedding worker processes so encodes stay off the event loop;
+        # they hold the model, so this process only loads it when there are none
+        await embedding_executor.start()
+        if not embedding_executor.running:
+            logger.info("Initializing in-process embedding model...")
+            await asyncio.to_thread(lambda: global_embedding_service.model)
+        
+        # Shared clients and services for every request in this worker
+        app.state.services = ServiceContainer(db.database)
+        
+        # Reclaim deleted vector storage in the background, finishing any left by a crash
+        await vector_sweeper.start(app.state.services.vector_service.backend)
+        
+        # Evict idle rate limit keys in the background (and attach the Mongo store if selected)
+        rate_limiter.start(db.database)
+        
+        # Start background consumers for queued conversation processing
+        await job_queue.start(db.database, app.state.services.rag_service)
         
         logger.info("Application startup completed successfully")
     except Exception as e:
@@ -43,7 +64,16 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down application...")
+    await job_queue.stop()
+    await rate_limiter.stop()
+    await vector_sweeper.stop()
+    if getattr(app.state, "services", None):
+        await app.state.services.close()
+    await embedding_batcher.stop()
+    await embedding_executor.stop()
+    embedding_cache.close()
     await close_database()
+    mark_worker_stopped()
 
 app = FastAPI(
     title="Production Call Center Q&A Processing API", 
@@ -69,6 +99,10 @@ async def add_process_time_header(request: Request, call_next):
     response = await call_next(request)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
+    # Label by route template so path parameters don't explode cardinality
+    route = request.scope.get("route")
+    HTTP_DURATION.labels(method=request.method, route=getattr(route, "path", "unmatched"),
+                         status=str(response.status_code)).observe(process_time)
     return response
 
 # Global exception handler
@@ -96,8 +130,13 @@ async def read_root():
             "PUT /organizations/{org_id}/questions/{question_id}": "Update question with validation",
             "GET /organizations/{org_id}/questions": "Get organization questions",
             "POST /organizations/{org_id}/conversations/upload": "Upload conversation file",
-            "POST /organizations/{org_id}/conversations": "Process conversation (async)",
+            "POST /organizations/conversations/": "Queue conversation processing (returns job)",
+            "POST /organizations/conversations/bulk": "Queue many calls for the bulk pipeline (returns job)",
+            "GET /jobs/{job_id}": "Get processing job status",
             "GET /organizations/{org_id}/conversations/{conv_id}/qa-pairs": "Get Q&A pairs",
+            "GET /rate-limits/stats": "Rate limiter key count and memory",
+            "GET /circuit-breakers/stats": "Dependency circuit breaker state",
+            "GET /metrics": "Prometheus metrics aggregated across workers",
         }
     }
 
@@ -116,7 +155,7 @@ async def health_check():
     
     # Check embedding model status
     try:
-        model_status = "healthy" if global_embedding_service.model is not None else "unhealthy"
+        model_status = "healthy" if global_embedding_service.ready else "unhealthy"
     except:
         model_status = "unhealthy"
     
@@ -129,11 +168,19 @@ async def health_check():
     
     return health_status
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics from every worker"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 # Store startup time
 start_time = time.time()
 
 if __name__ == "__main__":
     logger.info("Starting production server...")
+    # Workers share the metrics directory; start it empty for this run
+    reset_metrics_directory()
     uvicorn.run(
         "main:app", 
         host="0.0.0.0", 
@@ -0,0 +1,28 @@
+# scripts/backfill_question_embeddings.py
+"""
+One-shot backfill of stored retrieval embeddings for existing questions.
+
+Usage: python -m scripts.backfill_question_embeddings
+"""
+import asyncio
+import logging
+
+from core.database import init_database, close_database, db
+from services.question_embedding_service import QuestionEmbeddingService
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def main():
+    await init_database()
+    try:
+        result = await QuestionEmbeddingService(db.database).backfill()
+        logger.info(f"Backfill complete: {result}")
+    finally:
+        await close_database()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+# scripts/verify_indexes.py
+"""
+Reconcile indexes, then explain every registered query shape and report
+collection scans and in-memory sorts.
+
+Usage: python -m scripts.verify_indexes [--drop-stale]
+Exits 1 when any query is not fully served by an index.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from core.database import close_database, db
+from core.config import settings
+from core.indexes import reconcile_indexes, verify_indexes
+from motor.motor_asyncio import AsyncIOMotorClient
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def main(drop_stale: bool) -> int:
+    db.client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db.database = db.client[settings.DATABASE_NAME]
+    try:
+        report = await reconcile_indexes(db.database, drop_stale=drop_stale)
+        logger.info(f"Reconcile: {report}")
+        results = await verify_indexes(db.database)
+        for result in results:
+            status = "FAIL " + ",".join(result["problems"]) if result["problems"] else "ok"
+            logger.info(f"{result['collection']}.{result['query']}: {status} {result['stages']}")
+        return 1 if any(result["problems"] for result in results) else 0
+    finally:
+        await close_database()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drop-stale", action="store_true", help="drop indexes no query shape declares")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.drop_stale)))
@@ -1,40 +1,108 @@
 # services/ai_llm.py
 
 from openai import AsyncOpenAI
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from core.config import settings
+from core.circuit_breaker import circuit_breakers, is_transient
+from core.metrics import LLM_IN_FLIGHT, observe_stage, record_llm_call
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 class AIService:
-    def __init__(self):
-        if not settings.OPENAI_API_KEY:
-            raise ValueError("OpenAI API key not provided")
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY,timeout=60.0)
+    def __init__(self, client: Optional[AsyncOpenAI] = None):
+        if client is None:
+            if not settings.OPENAI_API_KEY:
+                raise ValueError("OpenAI API key not provided")
+            client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY,timeout=60.0)
+        self.client = client
+        self.requests_total = 0
+        self.requests_in_flight = 0
+    
+    async def _create_completion(self, **kwargs):
+        """Issue a chat completion request, tracking request counts"""
+        async with circuit_breakers.get("openai").call():
+            self.requests_total += 1
+            self.requests_in_flight += 1
+            LLM_IN_FLIGHT.inc()
+            try:
+                with observe_stage("llm"):
+                    response = await self.client.chat.completions.create(**kwargs)
+            except Exception:
+                record_llm_call(kwargs.get("model", ""), "error")
+                raise
+            finally:
+                self.requests_in_flight -= 1
+                LLM_IN_FLIGHT.dec()
+            record_llm_call(kwargs.get("model", ""), "success", getattr(response, "usage", None))
+            return response
 
     async def chat_completion(
         self, 
         messages: List[Dict[str, str]], 
         model: str = settings.OPENAI_MODEL,
-        temperature: float = 0.0
+        temperature: float = 0.0,
+        max_tokens: int = 1000
     ) -> str:
         """
         Perform a chat completion call using OpenAI's API.
+        Outages (see is_transient) are raised so callers can retry; other errors return "".
         """
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=model,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=1000
+                max_tokens=max_tokens
                 # timeout=30.0
             )
             return response.choices[0].message.content.strip()
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
+            if is_transient(e):
+                raise
             return ""
 
+    async def chat_completion_json(
+        self,
+        messages: List[Dict[str, str]],
+        schema: Dict[str, Any],
+        schema_name: str,
+        model: str = settings.OPENAI_MODEL,
+        temperature: float = 0.0,
+        max_tokens: int = 4000
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Perform a chat completion constrained to a JSON schema.
+
+        Returns the parsed JSON object, or None if the call failed or the
+        response could not be parsed. Outages are raised, as in chat_completion.
+        """
+        try:
+            response = await self._create_completion(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {"name": schema_name, "strict": True, "schema": schema}
+                }
+            )
+            content = response.choices[0].message.content
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            if is_transient(e):
+                raise
+            return None
+
+        try:
+            return json.loads(content)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Malformed JSON response for schema '{schema_name}': {e}")
+            return None
+
     async def question_ai_validation_check(
         self,
         industry_name: str,
@@ -0,0 +1,379 @@
+# services/bulk_pipeline.py
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from pymongo import UpdateOne
+
+from core.config import settings
+from core.leases import MongoLease
+from core.metrics import current_org_id, observe_stage
+from services.embedding_service import global_embedding_service
+from services.question_embedding_service import QuestionEmbeddingService
+from services.rag_services import ProgressCallback, RAGService, call_processing_flights
+from services.vector_backends import format_results, top_k_similar
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_DONE = object()
+
+class _CallWork:
+    """One call moving through the pipeline"""
+    __slots__ = ("call_sid", "record", "questions", "query_embeddings", "retrieved", "qa_pairs")
+    
+    def __init__(self, call_sid: str, record: Dict[str, Any]):
+        self.call_sid = call_sid
+        self.record = record
+        self.questions: List[Dict[str, Any]] = []
+        self.query_embeddings = None
+        self.retrieved: Optional[List[List[Dict[str, Any]]]] = None
+        self.qa_pairs: List[Dict[str, Any]] = []
+
+class BulkCallPipeline:
+    """
+    Processes many calls through bounded, concurrently running stages:
+    batched call fetch -> per-org question loading -> batched embedding and
+    retrieval -> concurrent LLM extraction -> grouped bulk writes.
+    Each stage hands work to the next through a bounded queue, so memory
+    stays flat regardless of how many call_sids are submitted. Calls are
+    registered with call_processing_flights and held under the same renewed
+    call_processing lease as the single-call path, so neither path runs a
+    call the other is already processing.
+    """
+    
+    def __init__(self, db, rag_service: RAGService):
+        self.db = db
+        self.rag_service = rag_service
+        self.question_embeddings = QuestionEmbeddingService(db)
+        self.lease = MongoLease(db)
+        self._org_questions: Dict[str, Any] = {}
+        self._leased: Dict[str, str] = {}  # call_sid -> lease owner token
+        self._flights: set = set()  # call_sids this run registered in call_processing_flights
+        self._results: Dict[str, Dict[str, Any]] = {}  # outcome handed to coalesced callers
+        self._joined: List[asyncio.Task] = []  # waits on single-call runs already in flight
+        self._stats = {"processed": 0, "skipped": 0, "failed": 0, "qa_pairs": 0}
+        self._errors: List[Dict[str, str]] = []
+        self._progress_callback: Optional[ProgressCallback] = None
+    
+    def _fail(self, call_sid: str, error: str):
+        self._stats["failed"] += 1
+        self._results[call_sid] = {"error": error, "processed": 0}
+        if len(self._errors) < 100:
+            self._errors.append({"call_sid": call_sid, "error": error})
+        logger.error(f"Bulk processing failed for {call_sid}: {error}")
+    
+    async def _release(self, call_sids: List[str]):
+        """Hand each call's outcome to coalesced callers and give up its lease"""
+        for call_sid in call_sids:
+            if call_sid in self._flights:
+                self._flights.discard(call_sid)
+                call_processing_flights.finish(call_sid, result=self._results.pop(
+                    call_sid, {"error": "Bulk processing stopped before this call finished", "processed": 0}))
+            token = self._leased.pop(call_sid, None)
+            if token:
+                try:
+                    await self.lease.release(f"call_processing:{call_sid}", token)
+                except Exception as e:
+                    # The lease expires on its own
+                    logger.warning(f"Failed to release lease for {call_sid}: {e}")
+    
+    async def _fail_remaining(self, inp: asyncio.Queue, error: str):
+        """Fail everything still queued for a stage that broke, so upstream stages never block"""
+        while (work := await inp.get()) is not _DONE:
+            self._fail(work.call_sid, error)
+            await self._release([work.call_sid])
+    
+    async def _keep_leases_alive(self):
+        """Renew every held lease while calls wait in the stage queues"""
+        while True:
+            await asyncio.sleep(settings.CALL_LEASE_SECONDS / 3)
+            for call_sid, token in list(self._leased.items()):
+                try:
+                    if not await self.lease.renew(f"call_processing:{call_sid}", token, settings.CALL_LEASE_SECONDS):
+                        logger.warning(f"Lost lease for {call_sid} during bulk processing")
+                except Exception as e:
+                    logger.warning(f"Failed to renew lease for {call_sid}: {e}")
+    
+    async def _join_flight(self, call_sid: str, in_flight):
+        """Count the outcome of a single-call run that was already processing call_sid"""
+        try:
+            result = await in_flight
+        except Exception as e:
+            self._fail(call_sid, str(e))
+            return
+        if result.get("error"):
+            self._fail(call_sid, result["error"])
+        elif result.get("skipped"):
+            self._stats["skipped"] += 1
+        else:
+            self._stats["processed"] += 1
+            self._stats["qa_pairs"] += result.get("processed", 0)
+    
+    async def _report(self, stage: str):
+        if self._progress_callback:
+            try:
+                await self._progress_callback(stage, dict(self._stats))
+            except Exception as e:
+                logger.warning(f"Bulk progress update failed: {e}")
+    
+    async def run(
+        self,
+        call_sids: List[str],
+        force: bool = False,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self._progress_callback = progress_callback
+        call_sids = list(dict.fromkeys(call_sids))
+        queue_size = settings.BULK_QUEUE_SIZE
+        fetched: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        grouped: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        embedded: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        extracted: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        
+        stages = [
+            self._fetch_stage(call_sids, force, fetched),
+            self._questions_stage(fetched, grouped),
+            self._embedding_stage(grouped, embedded),
+            self._extraction_stage(embedded, extracted),
+            self._write_stage(extracted)
+        ]
+        renewer = asyncio.create_task(self._keep_leases_alive())
+        try:
+            await asyncio.gather(*stages)
+            await asyncio.gather(*self._joined)
+        finally:
+            renewer.cancel()
+            await self._release(list(self._flights | set(self._leased)))
+        
+        elapsed = time.perf_counter() - started
+        return {
+            "requested": len(call_sids),
+            **self._stats,
+            "elapsed_seconds": round(elapsed, 3),
+            "calls_per_minute": round(self._stats["processed"] / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "errors": self._errors
+        }
+    
+    async def _fetch_stage(self, call_sids: List[str], force: bool, out: asyncio.Queue):
+        """Fetch call records in batches, falling back to AICallLog like the single-call path"""
+        try:
+            batch_size = settings.BULK_FETCH_BATCH_SIZE
+            for start in range(0, len(call_sids), batch_size):
+                batch = call_sids[start:start + batch_size]
+                records = {}
+                try:
+                    with observe_stage("fetch"):
+                        async for call in self.db.Call.find({"call_sid": {"$in": batch}}):
+                            records[call["call_sid"]] = call
+                        
+                        missing = [sid for sid in batch if not records.get(sid, {}).get("call_transcript")]
+                        if missing:
+                            async for call in self.db.AICallLog.find({"call_sid": {"$in": missing}}):
+                                records[call["call_sid"]] = call
+                except Exception as e:
+                    for call_sid in batch:
+                        self._fail(call_sid, f"Failed to fetch call: {e}")
+                    continue
+                
+                for call_sid in batch:
+                    record = records.get(call_sid)
+                    if not record or not record.get("call_transcript"):
+                        self._fail(call_sid, "Call record or transcription not found")
+                        continue
+                    if not force and record.get("qa_processed"):
+                        self._stats["skipped"] += 1
+                        continue
+                    if not record.get("organizationId"):
+                        self._fail(call_sid, "Organization not found for this call")
+                        continue
+                    if not call_processing_flights.begin(call_sid):
+                        # A single-call run in this worker already has it; share its outcome
+                        in_flight = call_processing_flights.join(call_sid)
+                        self._joined.append(asyncio.create_task(self._join_flight(call_sid, in_flight)))
+                        continue
+                    self._flights.add(call_sid)
+                    try:
+                        token = await self.lease.acquire(f"call_processing:{call_sid}", settings.CALL_LEASE_SECONDS)
+                    except Exception as e:
+                        token = None
+                        self._fail(call_sid, f"Failed to acquire lease: {e}")
+                    if not token:
+                        if call_sid not in self._results:
+                            self._fail(call_sid, "Call is being processed by another worker")
+                        await self._release([call_sid])
+                        continue
+                    self._leased[call_sid] = token
+                    await out.put(_CallWork(call_sid, record))
+        except Exception as e:
+            logger.error(f"Bulk fetch stage failed: {e}", exc_info=True)
+        finally:
+            await out.put(_DONE)
+    
+    async def _questions_stage(self, inp: asyncio.Queue, out: asyncio.Queue):
+        """Attach each call's org questions, loading every org's questions once"""
+        try:
+            while (work := await inp.get()) is not _DONE:
+                org_id = str(work.record["organizationId"])
+                try:
+                    if org_id not in self._org_questions:
+                        questions = await self.db.questions.find({"org_id": org_id}).to_list(length=None)
+                        embeddings = await self.question_embeddings.load_query_embeddings(questions) if questions else None
+                        self._org_questions[org_id] = (questions, embeddings)
+                    work.questions, work.query_embeddings = self._org_questions[org_id]
+                except Exception as e:
+                    self._fail(work.call_sid, f"Failed to load questions: {e}")
+                    await self._release([work.call_sid])
+                    continue
+                
+                if not work.questions:
+                    self._fail(work.call_sid, "No questions found for organization")
+                    await self._release([work.call_sid])
+                    continue
+                await out.put(work)
+        except Exception as e:
+            logger.error(f"Bulk questions stage failed: {e}", exc_info=True)
+            await self._fail_remaining(inp, f"Failed to load questions: {e}")
+        finally:
+            await out.put(_DONE)
+    
+    async def _embedding_stage(self, inp: asyncio.Queue, out: asyncio.Queue):
+        """Chunk several calls, embed all their chunks in one encode, and retrieve per question"""
+        done = False
+        try:
+            while not done:
+                batch = []
+                work = await inp.get()
+                while work is not _DONE:
+                    batch.append(work)
+                    if len(batch) >= settings.BULK_EMBED_BATCH_CALLS or inp.empty():
+                        break
+                    work = inp.get_nowait()
+                done = work is _DONE
+                if batch:
+                    await self._embed_batch(batch, out)
+        except Exception as e:
+            logger.error(f"Bulk embedding stage failed: {e}", exc_info=True)
+            if not done:
+                await self._fail_remaining(inp, f"Embedding failed: {e}")
+        finally:
+            await out.put(_DONE)
+    
+    async def _embed_batch(self, batch: List[_CallWork], out: asyncio.Queue):
+        try:
+            chunk_text = self.rag_service.vector_service.chunk_text
+            with observe_stage("chunk"):
+                chunked = await asyncio.to_thread(
+                    lambda: [chunk_text(work.record["call_transcript"]) for work in batch]
+                )
+            texts = [chunk["text"] for chunks in chunked for chunk in chunks]
+            with observe_stage("embed"):
+                embeddings = await global_embedding_service.encode_async(texts)
+        except Exception as e:
+            for work in batch:
+                self._fail(work.call_sid, f"Embedding failed: {e}")
+            await self._release([work.call_sid for work in batch])
+            return
+        
+        offset = 0
+        for work, chunks in zip(batch, chunked):
+            chunk_embeddings = embeddings[offset:offset + len(chunks)]
+            offset += len(chunks)
+            try:
+                metadatas = [{
+                    "conversation_id": work.call_sid,
+                    "chunk_id": chunk["chunk_id"],
+                    "start_index": chunk["start_index"],
+                    "end_index": chunk["end_index"],
+                    "index_unit": "char",
+                    "separator": chunk["separator"]
+                } for chunk in chunks]
+                
+                query_embeddings = work.query_embeddings
+                if query_embeddings is None:
+                    query_embeddings = await global_embedding_service.encode_async([
+                        QuestionEmbeddingService.build_query_text(q["question_text"], q.get("question_keywords", []))
+                        for q in work.questions
+                    ])
+                indices, similarities = top_k_similar(query_embeddings, chunk_embeddings, settings.TOP_K_RESULTS)
+                work.retrieved = format_results([chunk["text"] for chunk in chunks], metadatas, indices, similarities)
+            except Exception as e:
+                self._fail(work.call_sid, f"Retrieval failed: {e}")
+                await self._release([work.call_sid])
+                continue
+            await out.put(work)
+    
+    async def _extraction_stage(self, inp: asyncio.Queue, out: asyncio.Queue):
+        """Run LLM extraction for up to BULK_LLM_CONCURRENCY calls at once"""
+        async def worker():
+            while (work := await inp.get()) is not _DONE:
+                try:
+                    current_org_id.set(str(work.record["organizationId"]))
+                    results = await self.rag_service.extract_answers(work.call_sid, work.questions, work.retrieved)
+                    work.qa_pairs = [
+                        RAGService.build_qa_pair(work.record, question, result)
+                        for question, result in zip(work.questions, results) if result is not None
+                    ]
+                    await out.put(work)
+                except Exception as e:
+                    self._fail(work.call_sid, f"Extraction failed: {e}")
+                    await self._release([work.call_sid])
+            # Let sibling workers see the end marker too
+            await inp.put(_DONE)
+        
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(settings.BULK_LLM_CONCURRENCY, 1))))
+        finally:
+            await out.put(_DONE)
+    
+    async def _write_stage(self, inp: asyncio.Queue):
+        """Write QA pairs and processed flags for groups of calls in bulk"""
+        pending: List[_CallWork] = []
+        try:
+            while (work := await inp.get()) is not _DONE:
+                pending.append(work)
+                if len(pending) >= settings.BULK_WRITE_BATCH_CALLS:
+                    batch, pending = pending, []
+                    await self._write(batch)
+            if pending:
+                batch, pending = pending, []
+                await self._write(batch)
+        except Exception as e:
+            logger.error(f"Bulk write stage failed: {e}", exc_info=True)
+            for work in pending:
+                self._fail(work.call_sid, f"Failed to save QA pairs: {e}")
+            await self._release([work.call_sid for work in pending])
+            await self._fail_remaining(inp, f"Failed to save QA pairs: {e}")
+    
+    async def _write(self, batch: List[_CallWork]):
+        call_sids = [work.call_sid for work in batch]
+        # Like the single-call path, calls that yielded no pairs keep their earlier pairs
+        answered = [work for work in batch if work.qa_pairs]
+        qa_pairs = [pair for work in answered for pair in work.qa_pairs]
+        try:
+            if answered:
+                # Earlier runs' pairs are deleted only after the new ones are all in
+                with observe_stage("insert"):
+                    await self.rag_service.replace_qa_pairs([work.call_sid for work in answered], qa_pairs)
+                await self.db.Call.bulk_write([
+                    UpdateOne({"call_sid": work.call_sid},
+                              {"$set": {"qa_processed": True, "qa_pairs_count": len(work.qa_pairs)}})
+                    for work in answered
+                ], ordered=False)
+            for work in batch:
+                self._results[work.call_sid] = {
+                    "success": True,
+                    "call_sid": work.call_sid,
+                    "org_id": str(work.record["organizationId"]),
+                    "processed": len(work.qa_pairs),
+                    "total_questions": len(work.questions)
+                }
+            self._stats["processed"] += len(batch)
+            self._stats["qa_pairs"] += len(qa_pairs)
+        except Exception as e:
+            for call_sid in call_sids:
+                self._fail(call_sid, f"Failed to save QA pairs: {e}")
+        finally:
+            await self._release(call_sids)
+        await self._report("processing")
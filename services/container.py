@@ -0,0 +1,71 @@
+# services/container.py
+import logging
+from typing import Any, Dict
+import httpx
+from fastapi import Request
+from openai import AsyncOpenAI
+
+from core.config import settings
+from services.ai_llm import AIService
+from services.rag_services import RAGService
+from services.vector_service import VectorService
+
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """
+    Long-lived services shared by every request in a worker: one AsyncOpenAI
+    client on a pooled keep-alive httpx client, plus the vector and RAG services.
+    Created in main.lifespan and injected with Depends(get_services).
+    """
+    
+    def __init__(self, db):
+        if not settings.OPENAI_API_KEY:
+            raise ValueError("OpenAI API key not provided")
+        
+        self.db = db
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(60.0, connect=10.0)
+        )
+        self.openai_client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=self.http_client,
+            timeout=60.0
+        )
+        self.ai_service = AIService(client=self.openai_client)
+        self.vector_service = VectorService()
+        self.rag_service = RAGService(db, ai_service=self.ai_service, vector_service=self.vector_service)
+        logger.info("Service container initialized")
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection usage of the shared OpenAI HTTP pool"""
+        # httpx does not expose pool state publicly; read it best-effort from httpcore
+        pool = getattr(getattr(self.http_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "max_connections": settings.OPENAI_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": settings.OPENAI_KEEPALIVE_EXPIRY,
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "requests_total": self.ai_service.requests_total,
+            "requests_in_flight": self.ai_service.requests_in_flight
+        }
+    
+    async def close(self):
+        await self.http_client.aclose()
+        logger.info("Service container closed")
+
+async def get_services(request: Request) -> ServiceContainer:
+    """FastAPI dependency returning the app's service container"""
+    services = getattr(request.app.state, "services", None)
+    if services is None:
+        raise ValueError("Service container not initialized")
+    return services
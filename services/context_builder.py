@@ -0,0 +1,158 @@
+# services/context_builder.py
+import logging
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Prompt context windows (tokens) for the chat models we call
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+# Room left for the instructions, questions and the completion itself
+PROMPT_RESERVE_TOKENS = 4000
+
+@lru_cache(maxsize=16)
+def _encoding_for(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str, model: str) -> int:
+    """Prompt token count for a model; ~4 characters per token without tiktoken"""
+    if tiktoken is None:
+        return (len(text) + 3) // 4
+    return len(_encoding_for(model).encode(text, disallowed_special=()))
+
+def context_token_budget(model: str, requested: int) -> int:
+    """The requested budget, capped by what fits in the model's context window"""
+    window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    return max(0, min(requested, window - PROMPT_RESERVE_TOKENS))
+
+@dataclass
+class _Piece:
+    """A run of merged chunks: transcript offsets, text, and the transcript text just before it"""
+    unit: str
+    start: int
+    end: int
+    text: str
+    separator: Optional[str]
+    tokens: int = 0
+
+def _piece(chunk: Dict[str, Any]) -> Optional[_Piece]:
+    metadata = chunk.get("metadata") or {}
+    start, end = metadata.get("start_index"), metadata.get("end_index")
+    if start is None or end is None:
+        return None
+    return _Piece(metadata.get("index_unit", "word"), start, end, chunk["text"], metadata.get("separator"))
+
+def _continues(left: _Piece, right: _Piece) -> bool:
+    """Whether right overlaps left or follows it with only its recorded separator in between"""
+    if left.unit != right.unit:
+        return False
+    if right.start <= left.end:
+        return True
+    return left.unit == "char" and right.separator is not None and right.start - left.end == len(right.separator)
+
+def _joined(left: _Piece, right: _Piece, count: Optional[Callable[[str], int]]) -> _Piece:
+    """
+    left extended with the part of right beyond it. With count, tokens are
+    updated from the two pieces' counts and only the text at the join is counted.
+    """
+    if right.end <= left.end:
+        return left
+    overlap = left.end - right.start
+    if left.unit == "char":
+        if overlap >= 0:
+            text, dropped, added = left.text + right.text[overlap:], right.text[:overlap], ""
+        else:
+            text, dropped, added = left.text + right.separator + right.text, "", right.separator
+    else:
+        words = right.text.split()
+        text = " ".join([left.text] + words[overlap:])
+        dropped, added = " ".join(words[:overlap]), ""
+    tokens = 0
+    if count is not None:
+        tokens = left.tokens + right.tokens - (count(dropped) if dropped else 0) + (count(added) if added else 0)
+    return replace(left, end=right.end, text=text, tokens=tokens)
+
+def _merge_pieces(pieces: List[_Piece], count: Optional[Callable[[str], int]] = None) -> List[_Piece]:
+    pieces = sorted(pieces, key=lambda piece: (piece.unit, piece.start, -piece.end))
+    merged: List[_Piece] = []
+    for piece in pieces:
+        if merged and _continues(merged[-1], piece):
+            merged[-1] = _joined(merged[-1], piece, count)
+        else:
+            merged.append(piece)
+    return merged
+
+def merge_chunks(chunks: List[Dict[str, Any]]) -> List[str]:
+    """
+    Merge overlapping or adjacent chunks into non-repeating pieces in transcript
+    order. Offsets are characters for index_unit "char" and words for older
+    chunks; chunks without offsets are kept whole and deduplicated by text.
+    Adjacent char chunks are joined with the transcript text that separated
+    them, when the chunker recorded it.
+    """
+    positioned = []
+    loose = []
+    for chunk in chunks:
+        piece = _piece(chunk)
+        if piece is None:
+            if chunk["text"] not in loose:
+                loose.append(chunk["text"])
+        else:
+            positioned.append(piece)
+    return [piece.text for piece in _merge_pieces(positioned)] + loose
+
+def build_context(chunks: List[Dict[str, Any]], model: str, token_budget: int) -> Tuple[str, int]:
+    """
+    Assemble prompt context from chunks ranked best-first. Chunks are taken in
+    rank order while the merged, deduplicated context fits token_budget.
+    Each chunk is tokenized once; merging only counts the text at the joins.
+    Returns (context, number of chunks included).
+    """
+    budget = context_token_budget(model, token_budget)
+    
+    def count(text: str) -> int:
+        return count_tokens(text, model)
+    
+    separator_tokens = count(CONTEXT_SEPARATOR)
+    pieces: List[_Piece] = []
+    loose: List[str] = []
+    loose_tokens = 0
+    selected = 0
+    
+    for chunk in chunks:
+        piece = _piece(chunk)
+        candidate_pieces, candidate_loose, candidate_loose_tokens = pieces, loose, loose_tokens
+        if piece is not None:
+            piece.tokens = count(piece.text)
+            candidate_pieces = _merge_pieces(pieces + [piece], count)
+        elif chunk["text"] not in loose:
+            candidate_loose = loose + [chunk["text"]]
+            candidate_loose_tokens += count(chunk["text"])
+        
+        parts = len(candidate_pieces) + len(candidate_loose)
+        total = sum(p.tokens for p in candidate_pieces) + candidate_loose_tokens + separator_tokens * max(parts - 1, 0)
+        if total > budget:
+            continue
+        pieces, loose, loose_tokens = candidate_pieces, candidate_loose, candidate_loose_tokens
+        selected += 1
+    
+    context = CONTEXT_SEPARATOR.join([piece.text for piece in pieces] + loose)
+    return context, selected
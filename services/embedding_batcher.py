@@ -0,0 +1,159 @@
+# services/embedding_batcher.py
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+class _PendingEncode:
+    __slots__ = ("texts", "future", "enqueued_at")
+    
+    def __init__(self, texts: List[str], future: asyncio.Future):
+        self.texts = texts
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+class EmbeddingBatcher:
+    """
+    Coalesces encode requests from concurrent callers into one forward pass.
+    Requests arriving within window_ms of the first pending request (or until
+    max_batch_size texts are queued) are encoded together and the rows are
+    scattered back to each caller.
+    """
+    
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], Awaitable[np.ndarray]],
+        window_ms: float = 5.0,
+        max_batch_size: int = 64,
+        max_concurrent_batches: int = 1
+    ):
+        self.encode_fn = encode_fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_concurrent_batches = max(max_concurrent_batches, 1)
+        self._queue: asyncio.Queue = None
+        self._task: asyncio.Task = None
+        self._slots: asyncio.Semaphore = None
+        self._flushes = set()
+        self._reset_stats()
+    
+    def _reset_stats(self):
+        self._batches = 0
+        self._requests = 0
+        self._texts = 0
+        self._max_batch = 0
+        self._batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._errors = 0
+    
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._task = asyncio.create_task(self._run())
+    
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """Queue texts for the next batch and wait for their embeddings"""
+        texts = list(texts)
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingEncode(texts, future))
+        return await future
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = loop.time() + self.window
+            
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(pending)
+                size += len(pending.texts)
+            
+            # Requests keep accumulating while every batch slot is busy
+            await self._slots.acquire()
+            flush = asyncio.create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+    
+    async def _flush(self, batch: List[_PendingEncode]):
+        try:
+            started = time.perf_counter()
+            texts = [text for pending in batch for text in pending.texts]
+            self._record_batch(batch, len(texts), started)
+            
+            try:
+                embeddings = await self.encode_fn(texts) if texts else None
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Batched encode of {len(texts)} texts failed: {e}")
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                return
+            
+            offset = 0
+            for pending in batch:
+                rows = embeddings[offset:offset + len(pending.texts)] if embeddings is not None else np.empty((0, 0), dtype=np.float32)
+                offset += len(pending.texts)
+                if not pending.future.done():
+                    pending.future.set_result(rows)
+        finally:
+            self._slots.release()
+    
+    def _record_batch(self, batch: List[_PendingEncode], size: int, started: float):
+        self._batches += 1
+        self._requests += len(batch)
+        self._texts += size
+        self._max_batch = max(self._max_batch, size)
+        bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if size <= bound), len(BATCH_SIZE_BUCKETS))
+        self._batch_size_counts[bucket] += 1
+        for pending in batch:
+            wait = started - pending.enqueued_at
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size and queue-wait metrics since startup"""
+        histogram = {f"le_{bound}": count for bound, count in zip(BATCH_SIZE_BUCKETS, self._batch_size_counts)}
+        histogram["gt_256"] = self._batch_size_counts[-1]
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "batches": self._batches,
+            "requests": self._requests,
+            "texts": self._texts,
+            "avg_batch_size": self._texts / self._batches if self._batches else 0.0,
+            "avg_requests_per_batch": self._requests / self._batches if self._batches else 0.0,
+            "max_batch_size_seen": self._max_batch,
+            "batch_size_histogram": histogram,
+            "avg_queue_wait_ms": self._wait_total / self._requests * 1000.0 if self._requests else 0.0,
+            "max_queue_wait_ms": self._wait_max * 1000.0,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "errors": self._errors
+        }
+    
+    async def stop(self):
+        """Stop collecting new batches"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
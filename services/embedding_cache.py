@@ -0,0 +1,254 @@
+# services/embedding_cache.py
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; only the on-disk tier needs it
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SIZE = 16
+
+class DiskEmbeddingTier:
+    """
+    Fixed-capacity ring of float16 embeddings in memory-mapped files, shared by
+    every process that opens the same directory.
+
+    Layout: header.bin (next_row, dimension, capacity), keys.bin (one digest per
+    row) and vectors.f16 (one float16 row per slot). Writers append under an
+    flock and publish by bumping next_row last. A slot being overwritten has
+    its digest cleared before the vector is written and set again after, so
+    readers re-check the digest after copying a vector and drop torn reads.
+    """
+    
+    def __init__(self, path: str, capacity: int):
+        if fcntl is None:
+            raise RuntimeError("On-disk embedding cache requires fcntl (POSIX)")
+        self.path = path
+        self.capacity = capacity
+        self._header: Optional[np.memmap] = None
+        self._keys: Optional[np.memmap] = None
+        self._vectors: Optional[np.memmap] = None
+        self._index: Dict[bytes, int] = {}
+        self._slot_digests: Dict[int, bytes] = {}
+        self._synced = 0
+        # put_many runs in worker threads while get_many runs on the event loop
+        self._sync_lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._open_existing()
+    
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+    
+    @contextmanager
+    def _locked(self):
+        with open(self._file(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _open_existing(self):
+        if not os.path.exists(self._file("header.bin")):
+            return
+        header = np.memmap(self._file("header.bin"), dtype=np.int64, mode="r+", shape=(3,))
+        dimension, capacity = int(header[1]), int(header[2])
+        if capacity != self.capacity:
+            logger.warning(f"Embedding cache at {self.path} has capacity {capacity}, using it instead of {self.capacity}")
+            self.capacity = capacity
+        self._keys = np.memmap(self._file("keys.bin"), dtype=np.uint8, mode="r+", shape=(capacity, DIGEST_SIZE))
+        self._vectors = np.memmap(self._file("vectors.f16"), dtype=np.float16, mode="r+", shape=(capacity, dimension))
+        self._header = header
+    
+    def _create(self, dimension: int):
+        with self._locked():
+            # Another process may have created the files first
+            if not os.path.exists(self._file("header.bin")):
+                np.memmap(self._file("keys.bin"), dtype=np.uint8, mode="w+", shape=(self.capacity, DIGEST_SIZE)).flush()
+                np.memmap(self._file("vectors.f16"), dtype=np.float16, mode="w+", shape=(self.capacity, dimension)).flush()
+                header = np.memmap(self._file("header.bin"), dtype=np.int64, mode="w+", shape=(3,))
+                header[:] = (0, dimension, self.capacity)
+                header.flush()
+        self._open_existing()
+    
+    def _sync(self):
+        """Index rows appended by any process since the last sync"""
+        with self._sync_lock:
+            next_row = int(self._header[0])
+            start = max(self._synced, next_row - self.capacity)
+            for row in range(start, next_row):
+                slot = row % self.capacity
+                digest = self._keys[slot].tobytes()
+                previous = self._slot_digests.get(slot)
+                if previous is not None and self._index.get(previous) == slot:
+                    del self._index[previous]
+                self._slot_digests[slot] = digest
+                self._index[digest] = slot
+            self._synced = max(self._synced, next_row)
+    
+    def get_many(self, digests: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        if self._header is None:
+            self._open_existing()
+            if self._header is None:
+                return [None] * len(digests)
+        
+        self._sync()
+        results = []
+        for digest in digests:
+            slot = self._index.get(digest)
+            vector = None
+            if slot is not None and self._keys[slot].tobytes() == digest:
+                vector = np.array(self._vectors[slot], dtype=np.float32)
+                # The slot may have been recycled by a writer while the vector was copied
+                if self._keys[slot].tobytes() != digest:
+                    vector = None
+            results.append(vector)
+        return results
+    
+    def put_many(self, digests: Sequence[bytes], vectors: Sequence[np.ndarray]):
+        if not digests:
+            return
+        if self._header is None:
+            self._create(len(vectors[0]))
+        
+        with self._locked():
+            self._sync()
+            next_row = int(self._header[0])
+            written = set()
+            for digest, vector in zip(digests, vectors):
+                if digest in self._index or digest in written or len(vector) != self._vectors.shape[1]:
+                    continue
+                written.add(digest)
+                slot = next_row % self.capacity
+                self._keys[slot] = 0
+                self._vectors[slot] = np.asarray(vector, dtype=np.float16)
+                self._keys[slot] = np.frombuffer(digest, dtype=np.uint8)
+                next_row += 1
+            # Publish the new rows only after they are fully written
+            self._header[0] = next_row
+        self._sync()
+    
+    @property
+    def entries(self) -> int:
+        return min(int(self._header[0]), self.capacity) if self._header is not None else 0
+    
+    def close(self):
+        for mapped in (self._vectors, self._keys, self._header):
+            if mapped is not None:
+                mapped.flush()
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by a hash of the model name and text.
+    A bounded in-memory LRU tier sits in front of an optional on-disk tier.
+    """
+    
+    def __init__(self, model_name: str, max_entries: int, disk_path: Optional[str] = None, disk_capacity: int = 200000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._disk: Optional[DiskEmbeddingTier] = None
+        if disk_path:
+            try:
+                model_dir = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+                self._disk = DiskEmbeddingTier(os.path.join(disk_path, model_dir), disk_capacity)
+            except Exception as e:
+                logger.error(f"Failed to open on-disk embedding cache at {disk_path}: {e}")
+        self._lookups = 0
+        self._memory_hits = 0
+        self._disk_hits = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self._disk is not None
+    
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()[:DIGEST_SIZE]
+    
+    def _remember(self, digest: bytes, vector: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        self._memory[digest] = vector
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors for texts, None where the text has not been seen"""
+        digests = [self.key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = []
+        for digest in digests:
+            vector = self._memory.get(digest)
+            if vector is not None:
+                self._memory.move_to_end(digest)
+                self._memory_hits += 1
+            results.append(vector)
+        self._lookups += len(digests)
+        
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing and self._disk is not None:
+            try:
+                disk_vectors = self._disk.get_many([digests[i] for i in missing])
+            except Exception as e:
+                logger.error(f"On-disk embedding cache read failed: {e}")
+                disk_vectors = [None] * len(missing)
+            for i, vector in zip(missing, disk_vectors):
+                if vector is not None:
+                    self._disk_hits += 1
+                    results[i] = vector
+                    self._remember(digests[i], vector)
+        return results
+    
+    def _remember_many(self, texts: Sequence[str], vectors: Sequence[np.ndarray]):
+        digests = [self.key(text) for text in texts]
+        vectors = [np.asarray(vector, dtype=np.float32) for vector in vectors]
+        for digest, vector in zip(digests, vectors):
+            self._remember(digest, vector)
+        return digests, vectors
+    
+    def _write_disk(self, digests: List[bytes], vectors: List[np.ndarray]):
+        try:
+            self._disk.put_many(digests, vectors)
+        except Exception as e:
+            logger.error(f"On-disk embedding cache write failed: {e}")
+    
+    def put_many(self, texts: Sequence[str], vectors: Sequence[np.ndarray]):
+        digests, vectors = self._remember_many(texts, vectors)
+        if self._disk is not None:
+            self._write_disk(digests, vectors)
+    
+    async def put_many_async(self, texts: Sequence[str], vectors: Sequence[np.ndarray]):
+        """put_many with the on-disk write (flock and memmap copy) done in a worker thread"""
+        digests, vectors = self._remember_many(texts, vectors)
+        if self._disk is not None:
+            await asyncio.to_thread(self._write_disk, digests, vectors)
+    
+    def stats(self) -> Dict[str, Any]:
+        hits = self._memory_hits + self._disk_hits
+        return {
+            "lookups": self._lookups,
+            "hits": hits,
+            "memory_hits": self._memory_hits,
+            "disk_hits": self._disk_hits,
+            "misses": self._lookups - hits,
+            "hit_rate": hits / self._lookups if self._lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_capacity": self.max_entries,
+            "disk_entries": self._disk.entries if self._disk else None,
+            "disk_capacity": self._disk.capacity if self._disk else None
+        }
+    
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
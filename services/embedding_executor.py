@@ -0,0 +1,111 @@
+# services/embedding_executor.py
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import List, Optional
+import numpy as np
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Model held by each worker process
+_worker_model = None
+
+def _init_worker(model_name: str):
+    """Load the SentenceTransformer model once per worker process"""
+    global _worker_model
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name)
+
+def _worker_dimension() -> int:
+    """Embedding dimension of the worker's model"""
+    return _worker_model.get_sentence_embedding_dimension()
+
+def _encode_into_shared_memory(shm_name: str, texts: List[str], dimension: int) -> int:
+    """Encode texts and write the float32 rows into the parent's shared-memory block"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        rows = np.ndarray((len(texts), dimension), dtype=np.float32, buffer=shm.buf)
+        rows[:] = _worker_model.encode(texts, convert_to_numpy=True)
+        del rows  # release the buffer export before closing
+    finally:
+        shm.close()
+    return len(texts)
+
+class EmbeddingExecutor:
+    """
+    Runs SentenceTransformer encodes in a pool of worker processes so the
+    event loop is never blocked by a forward pass. Results are returned
+    through shared-memory float32 buffers instead of pickled lists.
+    """
+    
+    def __init__(self, workers: int, model_name: str):
+        self.workers = workers
+        self.model_name = model_name
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._dimension: Optional[int] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._pool is not None
+    
+    @property
+    def dimension(self) -> Optional[int]:
+        """Embedding dimension reported by the worker's model, once started"""
+        return self._dimension
+    
+    async def start(self):
+        """Start the worker pool and wait for the model to load in a worker"""
+        if self.workers <= 0 or self._pool is not None:
+            return
+        
+        logger.info(f"Starting {self.workers} embedding worker process(es)")
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_name,)
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            self._dimension = await loop.run_in_executor(self._pool, _worker_dimension)
+            logger.info(f"Embedding workers ready (dimension {self._dimension})")
+        except Exception as e:
+            logger.error(f"Failed to start embedding workers: {e}")
+            await self.stop()
+            raise
+    
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in a worker process"""
+        if self._pool is None:
+            raise RuntimeError("Embedding executor is not running")
+        
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self._dimension), dtype=np.float32)
+        
+        shm = shared_memory.SharedMemory(create=True, size=len(texts) * self._dimension * 4)
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._pool, _encode_into_shared_memory, shm.name, texts, self._dimension)
+            return np.ndarray((len(texts), self._dimension), dtype=np.float32, buffer=shm.buf).copy()
+        except BrokenProcessPool:
+            logger.error("Embedding worker pool crashed, falling back to in-process encoding")
+            await self.stop()
+            raise
+        finally:
+            shm.close()
+            shm.unlink()
+    
+    async def stop(self):
+        """Shut down the worker pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            logger.info("Embedding workers stopped")
+
+# Global instance
+embedding_executor = EmbeddingExecutor(settings.EMBEDDING_WORKERS, settings.EMBEDDING_MODEL)
@@ -1,27 +1,50 @@
 # services/embedding_service.py
+import asyncio
 import logging
-from sentence_transformers import SentenceTransformer
+from concurrent.futures.process import BrokenProcessPool
+import os
+import numpy as np
 from core.config import settings
+from services.embedding_batcher import EmbeddingBatcher
+from services.embedding_cache import EmbeddingCache
+from services.embedding_executor import embedding_executor
 
 logger = logging.getLogger(__name__)
 
+# Content-addressed cache so re-processed transcripts only encode new text
+embedding_cache = EmbeddingCache(
+    settings.EMBEDDING_MODEL,
+    max_entries=settings.EMBEDDING_CACHE_SIZE,
+    disk_path=settings.EMBEDDING_CACHE_DISK_PATH,
+    disk_capacity=settings.EMBEDDING_CACHE_DISK_CAPACITY
+)
+
+def hub_model_id(model_name: str) -> str:
+    """Hugging Face repo id for a model name; short names resolve the way sentence-transformers does"""
+    if "/" not in model_name and not os.path.isdir(model_name):
+        return f"sentence-transformers/{model_name}"
+    return model_name
+
 class GlobalEmbeddingService:
-    """Singleton service for managing the SentenceTransformer model globally"""
+    """
+    Singleton front end for embedding encodes. Encodes run in the embedding
+    worker processes, so this process only loads the tokenizer (for chunking);
+    the full SentenceTransformer model is loaded here lazily, and only when
+    encodes fall back to a thread because the worker pool is off or broken.
+    """
     _instance = None
     _model = None
+    _tokenizer = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(GlobalEmbeddingService, cls).__new__(cls)
         return cls._instance
     
-    def __init__(self):
-        if self._model is None:
-            self._load_model()
-    
     def _load_model(self):
         """Load the SentenceTransformer model once"""
         try:
+            from sentence_transformers import SentenceTransformer
             logger.info(f"Loading SentenceTransformer model: {settings.EMBEDDING_MODEL}")
             self._model = SentenceTransformer(settings.EMBEDDING_MODEL)
             logger.info("SentenceTransformer model loaded successfully")
@@ -29,18 +52,101 @@ class GlobalEmbeddingService:
             logger.error(f"Failed to load SentenceTransformer model: {e}")
             raise
     
-    def encode(self, texts):
-        """Encode texts using the global model"""
+    def _encode_with_model(self, texts):
         if self._model is None:
             self._load_model()
         return self._model.encode(texts)
     
+    @property
+    def tokenizer(self):
+        """The model's tokenizer, loaded without the model weights"""
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(hub_model_id(settings.EMBEDDING_MODEL))
+        return self._tokenizer
+    
+    @property
+    def dimension(self) -> int:
+        if embedding_executor.dimension:
+            return embedding_executor.dimension
+        if self._model is not None:
+            return self._model.get_sentence_embedding_dimension()
+        return settings.EMBEDDING_DIMENSION
+    
+    @property
+    def ready(self) -> bool:
+        """Whether encodes can run without loading anything first"""
+        return embedding_executor.running or self._model is not None
+    
+    def _lookup_cached(self, texts):
+        """Return cached vectors (None for misses) and the distinct texts that still need encoding"""
+        cached = embedding_cache.get_many(texts) if embedding_cache.enabled else [None] * len(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        return cached, missing
+    
+    def _merge_encoded(self, texts, cached, missing, vectors) -> np.ndarray:
+        """Assemble cached and freshly encoded vectors in input order"""
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        if missing:
+            vectors = np.asarray(vectors, dtype=np.float32)
+            encoded = dict(zip(missing, vectors))
+            cached = [vector if vector is not None else encoded[text] for text, vector in zip(texts, cached)]
+        return np.stack(cached).astype(np.float32, copy=False)
+    
+    def encode(self, texts):
+        """Encode texts using the global model, encoding only cache misses"""
+        if isinstance(texts, str):
+            return self._encode_with_model(texts)
+        texts = list(texts)
+        cached, missing = self._lookup_cached(texts)
+        vectors = None
+        if missing:
+            vectors = self._encode_with_model(missing)
+            if embedding_cache.enabled:
+                embedding_cache.put_many(missing, vectors)
+        return self._merge_encoded(texts, cached, missing, vectors)
+    
+    async def encode_async(self, texts) -> np.ndarray:
+        """
+        Encode texts without blocking the event loop, encoding only cache misses.
+        Concurrent calls are coalesced into shared batches when micro-batching is enabled.
+        """
+        texts = list(texts)
+        cached, missing = self._lookup_cached(texts)
+        vectors = None
+        if missing:
+            if settings.EMBEDDING_MICROBATCH_ENABLED:
+                vectors = await embedding_batcher.encode(missing)
+            else:
+                vectors = await self.encode_unbatched(missing)
+            if embedding_cache.enabled:
+                await embedding_cache.put_many_async(missing, vectors)
+        return self._merge_encoded(texts, cached, missing, vectors)
+    
+    async def encode_unbatched(self, texts) -> np.ndarray:
+        """Encode texts in the embedding worker pool when it is running, otherwise in a thread"""
+        if embedding_executor.running:
+            try:
+                return await embedding_executor.encode(texts)
+            except BrokenProcessPool:
+                pass
+        return await asyncio.to_thread(self._encode_with_model, list(texts))
+    
     @property
     def model(self):
-        """Get the model instance"""
+        """The in-process model, loaded on first use"""
         if self._model is None:
             self._load_model()
         return self._model
 
 # Global instance
 global_embedding_service = GlobalEmbeddingService()
+
+# Coalesces concurrent encode_async calls into shared forward passes
+embedding_batcher = EmbeddingBatcher(
+    global_embedding_service.encode_unbatched,
+    window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+    max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+    max_concurrent_batches=max(settings.EMBEDDING_WORKERS, 1)
+)
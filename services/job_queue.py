@@ -0,0 +1,258 @@
+# services/job_queue.py
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from api.models import ProcessingStatus
+from core.config import settings
+from core.metrics import JOBS_IN_FLIGHT
+from services.bulk_pipeline import BulkCallPipeline
+from services.rag_services import RAGService
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """
+    Durable conversation-processing queue stored in the `processing_jobs`
+    collection. Any uvicorn worker can enqueue; every worker runs a pool of
+    consumers that claim jobs with an atomic find_one_and_update and hold a
+    renewable lease, so jobs from crashed workers are picked up again.
+    A job processes either one call_sid or, for kind "bulk", a list of
+    call_sids through the BulkCallPipeline.
+    """
+    
+    def __init__(
+        self,
+        concurrency: int = 2,
+        poll_interval: float = 1.0,
+        lease_seconds: int = 300,
+        max_attempts: int = 3
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.db = None
+        self.rag_service: Optional[RAGService] = None
+        self._workers: List[asyncio.Task] = []
+        self._in_flight = 0
+    
+    @property
+    def collection(self):
+        if self.db is None:
+            raise ValueError("Job queue not initialized")
+        return self.db.processing_jobs
+    
+    async def start(self, db, rag_service: RAGService):
+        """Attach to the database and start the consumer tasks"""
+        self.db = db
+        self.rag_service = rag_service
+        for n in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._consume(n)))
+        logger.info(f"Job queue started with {self.concurrency} consumer(s) as {self.worker_id}")
+    
+    async def stop(self):
+        """Stop consuming; jobs in progress are reclaimed after their lease expires"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+    
+    async def enqueue(self, call_sid: str, force: bool = False) -> Dict[str, Any]:
+        """
+        Add a processing job for a call and return the job document.
+        A call that already has a pending or running job gets that job back.
+        Call jobs carry active=True until they finish; a unique partial index
+        on call_sid makes concurrent enqueues for one call agree on one job.
+        """
+        while True:
+            active = await self.collection.find_one({"call_sid": call_sid, "active": True})
+            if active:
+                return active
+            
+            job = self._new_job(call_sid=call_sid, force=force, active=True)
+            try:
+                result = await self.collection.insert_one(job)
+            except DuplicateKeyError:
+                # A concurrent enqueue won; return its job
+                continue
+            job["_id"] = result.inserted_id
+            return job
+    
+    async def enqueue_bulk(self, call_sids: List[str], force: bool = False) -> Dict[str, Any]:
+        """Add one job that runs many calls through the bulk pipeline and return the job document"""
+        job = self._new_job(kind="bulk", call_sid=None, call_sids=list(dict.fromkeys(call_sids)), force=force)
+        result = await self.collection.insert_one(job)
+        job["_id"] = result.inserted_id
+        return job
+    
+    @staticmethod
+    def _new_job(**fields) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        return {
+            "kind": "call",
+            "status": ProcessingStatus.PENDING.value,
+            "progress": {"stage": "queued"},
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "worker_id": None,
+            "lease_expires_at": None,
+            "available_at": now,
+            "created_at": now,
+            "updated_at": now,
+            **fields
+        }
+    
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": ObjectId(job_id)})
+    
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest runnable job, including ones whose lease has expired"""
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": ProcessingStatus.PENDING.value, "available_at": {"$lte": now}},
+                {"status": ProcessingStatus.IN_PROGRESS.value, "lease_expires_at": {"$lt": now},
+                 "attempts": {"$lt": self.max_attempts}}
+            ]},
+            {
+                "$set": {
+                    "status": ProcessingStatus.IN_PROGRESS.value,
+                    "worker_id": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def _fail_abandoned(self):
+        """Fail jobs whose lease expired after their last allowed attempt"""
+        now = datetime.utcnow()
+        await self.collection.update_many(
+            {"status": ProcessingStatus.IN_PROGRESS.value, "lease_expires_at": {"$lt": now},
+             "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": ProcessingStatus.FAILED.value, "error": "Exceeded maximum attempts",
+                      "active": False, "updated_at": now}}
+        )
+    
+    async def _owned_update(self, job_id: ObjectId, fields: Dict[str, Any]):
+        """Update a job only while this worker still holds it"""
+        fields["updated_at"] = datetime.utcnow()
+        await self.collection.update_one({"_id": job_id, "worker_id": self.worker_id}, {"$set": fields})
+    
+    async def _heartbeat(self, job_id: ObjectId):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._owned_update(job_id, {
+                    "lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+                })
+            except Exception as e:
+                logger.warning(f"Failed to renew lease for job {job_id}: {e}")
+    
+    async def _consume(self, n: int):
+        while True:
+            try:
+                job = await self._claim()
+                if job is None:
+                    await self._fail_abandoned()
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job consumer {n} error: {e}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+    
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["_id"]
+        bulk = job.get("kind") == "bulk"
+        target = f"{len(job['call_sids'])} calls" if bulk else f"call {job['call_sid']}"
+        logger.info(f"Processing job {job_id} for {target} (attempt {job['attempts']})")
+        
+        async def on_progress(stage: str, details: Dict[str, Any]):
+            await self._owned_update(job_id, {"progress": {"stage": stage, **details}})
+        
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        self._in_flight += 1
+        source = "bulk" if bulk else "queue"
+        JOBS_IN_FLIGHT.labels(source=source).inc()
+        try:
+            if bulk:
+                result = await BulkCallPipeline(self.db, self.rag_service).run(
+                    job["call_sids"], force=job.get("force", False), progress_callback=on_progress
+                )
+            else:
+                result = await self.rag_service.process_call(
+                    job["call_sid"], force=job.get("force", False), progress_callback=on_progress
+                )
+            if result.get("error") and result.get("retryable"):
+                await self._retry_or_fail(job, result["error"])
+            elif result.get("error"):
+                await self._owned_update(job_id, {
+                    "status": ProcessingStatus.FAILED.value,
+                    "progress": {"stage": "failed"},
+                    "result": result,
+                    "error": result["error"],
+                    "active": False
+                })
+            else:
+                await self._owned_update(job_id, {
+                    "status": ProcessingStatus.COMPLETED.value,
+                    "progress": {"stage": "completed", "processed": result.get("processed"),
+                                 "questions_total": result.get("total_questions")},
+                    "result": result,
+                    "error": None,
+                    "active": False
+                })
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+            await self._retry_or_fail(job, str(e))
+        finally:
+            self._in_flight -= 1
+            JOBS_IN_FLIGHT.labels(source=source).dec()
+            heartbeat.cancel()
+    
+    async def _retry_or_fail(self, job: Dict[str, Any], error: str):
+        """Requeue a job with exponential backoff, or fail it once it is out of attempts"""
+        retry = job["attempts"] < self.max_attempts
+        if retry:
+            logger.info(f"Retrying job {job['_id']} after attempt {job['attempts']}: {error}")
+        await self._owned_update(job["_id"], {
+            "status": ProcessingStatus.PENDING.value if retry else ProcessingStatus.FAILED.value,
+            "available_at": datetime.utcnow() + timedelta(seconds=self.poll_interval * 2 ** job["attempts"]),
+            "error": error,
+            "active": retry
+        })
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "in_flight": self._in_flight,
+            "consumers": len(self._workers)
+        }
+
+# Global instance
+job_queue = JobQueue(
+    concurrency=settings.JOB_WORKER_CONCURRENCY,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS
+)
@@ -19,7 +19,7 @@ class QARetrievalService:
             qa_pairs_cursor = self.db.qa_pairs.find({"conv_id": conv_id, "org_id": ObjectId(org_id)}).sort("createdAt", -1)
             qa_pairs = await qa_pairs_cursor.to_list(length=None)
 
-            print(f"\n\n QA Pairs: {qa_pairs} \n\n")
+            logger.debug(f"Retrieved {len(qa_pairs)} QA pairs for conversation {conv_id}")
             
             if not qa_pairs:
                 raise HTTPException(status_code=404, detail="No Q&A pairs found")
@@ -0,0 +1,66 @@
+# services/question_duplicate_detector.py
+import logging
+from dataclasses import dataclass, field
+from typing import List
+from core.config import settings
+from services.embedding_service import global_embedding_service
+from services.validation_cache import ValidationCache
+from services.vector_backends import top_k_similar
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE = "duplicate"
+NOVEL = "novel"
+AMBIGUOUS = "ambiguous"
+
+@dataclass
+class DuplicateCheck:
+    """Local duplicate decision plus the nearest existing questions for the LLM"""
+    decision: str
+    best_similarity: float = 0.0
+    nearest_questions: List[str] = field(default_factory=list)
+
+class QuestionDuplicateDetector:
+    """
+    Nearest-neighbour duplicate check of a new question against an org's
+    existing questions. Question texts go through the shared embedding cache,
+    so an org's question set is only encoded once.
+    """
+    
+    def __init__(self, duplicate_threshold: float, novel_threshold: float, candidates: int):
+        self.duplicate_threshold = duplicate_threshold
+        self.novel_threshold = novel_threshold
+        self.candidates = candidates
+    
+    async def check(self, question: str, existing_questions: List[str]) -> DuplicateCheck:
+        if not existing_questions:
+            return DuplicateCheck(NOVEL)
+        
+        normalized = ValidationCache.normalize(question)
+        for existing in existing_questions:
+            if ValidationCache.normalize(existing) == normalized:
+                return DuplicateCheck(DUPLICATE, 1.0, [existing])
+        
+        try:
+            embeddings = await global_embedding_service.encode_async([question] + list(existing_questions))
+        except Exception as e:
+            # Without embeddings the LLM has to see the whole question set
+            logger.error(f"Duplicate prefilter failed, falling back to full LLM check: {e}")
+            return DuplicateCheck(AMBIGUOUS, 0.0, list(existing_questions))
+        
+        indices, similarities = top_k_similar(embeddings[:1], embeddings[1:], self.candidates)
+        nearest = [existing_questions[index] for index in indices[0].tolist()]
+        best = float(similarities[0][0])
+        
+        if best >= self.duplicate_threshold:
+            return DuplicateCheck(DUPLICATE, best, nearest[:1])
+        if best < self.novel_threshold:
+            return DuplicateCheck(NOVEL, best)
+        return DuplicateCheck(AMBIGUOUS, best, nearest)
+
+# Global instance
+question_duplicate_detector = QuestionDuplicateDetector(
+    duplicate_threshold=settings.DUPLICATE_QUESTION_THRESHOLD,
+    novel_threshold=settings.NOVEL_QUESTION_THRESHOLD,
+    candidates=settings.DUPLICATE_QUESTION_CANDIDATES
+)
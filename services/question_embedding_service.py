@@ -0,0 +1,118 @@
+# services/question_embedding_service.py
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+from pymongo import UpdateOne
+from core.config import settings
+from services.embedding_service import global_embedding_service
+
+logger = logging.getLogger(__name__)
+
+class QuestionEmbeddingService:
+    """
+    Retrieval embeddings for organization questions, stored on the question
+    document under `query_embedding` and keyed by embedding model and text hash.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+    
+    @staticmethod
+    def build_query_text(question_text: str, keywords: List[str]) -> str:
+        """Build the retrieval query for a question and its keywords"""
+        return f"{question_text} {' '.join(keywords)}"
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    @classmethod
+    def _query_text_for(cls, question: Dict[str, Any]) -> str:
+        return cls.build_query_text(question["question_text"], question.get("question_keywords", []))
+    
+    @classmethod
+    def _embedding_document(cls, query_text: str, vector: np.ndarray) -> Dict[str, Any]:
+        return {
+            "model": settings.EMBEDDING_MODEL,
+            "text_hash": cls.text_hash(query_text),
+            "vector": np.asarray(vector, dtype=np.float32).tolist(),
+            "computed_at": datetime.utcnow()
+        }
+    
+    @classmethod
+    def is_current(cls, question: Dict[str, Any]) -> bool:
+        """Whether the stored embedding matches the current model and question text"""
+        stored = question.get("query_embedding")
+        return bool(
+            stored
+            and stored.get("vector")
+            and stored.get("model") == settings.EMBEDDING_MODEL
+            and stored.get("text_hash") == cls.text_hash(cls._query_text_for(question))
+        )
+    
+    @classmethod
+    async def compute(cls, question_text: str, keywords: List[str]) -> Optional[Dict[str, Any]]:
+        """Compute the embedding document for a question, or None if encoding fails"""
+        query_text = cls.build_query_text(question_text, keywords)
+        try:
+            vector = (await global_embedding_service.encode_async([query_text]))[0]
+        except Exception as e:
+            logger.error(f"Failed to compute question embedding: {e}")
+            return None
+        return cls._embedding_document(query_text, vector)
+    
+    async def _refresh(self, questions: List[Dict[str, Any]]) -> int:
+        """Recompute and persist embeddings for the given questions in place"""
+        if not questions:
+            return 0
+        
+        query_texts = [self._query_text_for(question) for question in questions]
+        vectors = await global_embedding_service.encode_async(query_texts)
+        
+        updates = []
+        for question, query_text, vector in zip(questions, query_texts, vectors):
+            question["query_embedding"] = self._embedding_document(query_text, vector)
+            updates.append(UpdateOne({"_id": question["_id"]}, {"$set": {"query_embedding": question["query_embedding"]}}))
+        
+        try:
+            await self.db.questions.bulk_write(updates, ordered=False)
+        except Exception as e:
+            # The vectors are still usable for this call
+            logger.error(f"Failed to persist question embeddings: {e}")
+        return len(updates)
+    
+    async def load_query_embeddings(self, questions: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Return the retrieval embeddings for questions as a float32 matrix, in order.
+        Only questions whose stored embedding is missing or stale are re-encoded.
+        """
+        stale = [question for question in questions if not self.is_current(question)]
+        if stale:
+            logger.info(f"Recomputing {len(stale)} stale question embeddings")
+            await self._refresh(stale)
+        return np.asarray([question["query_embedding"]["vector"] for question in questions], dtype=np.float32)
+    
+    async def backfill(self, batch_size: int = 256) -> Dict[str, int]:
+        """Compute embeddings for every question that lacks a current one"""
+        scanned = updated = 0
+        pending = []
+        cursor = self.db.questions.find(
+            {},
+            {"question_text": 1, "question_keywords": 1, "query_embedding.model": 1, "query_embedding.text_hash": 1}
+        )
+        async for question in cursor:
+            scanned += 1
+            stored = question.get("query_embedding") or {}
+            if (stored.get("model") == settings.EMBEDDING_MODEL
+                    and stored.get("text_hash") == self.text_hash(self._query_text_for(question))):
+                continue
+            pending.append(question)
+            if len(pending) >= batch_size:
+                updated += await self._refresh(pending)
+                pending = []
+        updated += await self._refresh(pending)
+        
+        logger.info(f"Question embedding backfill: scanned {scanned}, updated {updated}")
+        return {"scanned": scanned, "updated": updated}
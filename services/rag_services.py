@@ -1,100 +1,230 @@
 # services/rag_services.py - UPDATED VERSION
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+import asyncio
+import uuid
+from core.circuit_breaker import is_transient
+from core.config import settings
+from core.leases import MongoLease
+from core.metrics import current_org_id, observe_stage
+from core.single_flight import SingleFlight
 from services.ai_llm import AIService
+from services.context_builder import build_context
+from services.question_embedding_service import QuestionEmbeddingService
 from services.vector_service import VectorService
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Called with (stage, details) as processing advances
+ProgressCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# Structured output schema for batched extraction
+BATCH_ANSWERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "answers": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question_number": {"type": "integer"},
+                    "answer": {"type": "string"}
+                },
+                "required": ["question_number", "answer"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["answers"],
+    "additionalProperties": False
+}
+
+# Concurrent requests for the same call_sid in this process share one run
+call_processing_flights = SingleFlight()
+
 class RAGService:
-    def __init__(self, db):
+    def __init__(self, db, ai_service: Optional[AIService] = None, vector_service: Optional[VectorService] = None):
         self.db = db
-        self.ai_service = AIService()
-        self.vector_service = VectorService()
+        self.ai_service = ai_service or AIService()
+        self.vector_service = vector_service or VectorService()
+        self.question_embeddings = QuestionEmbeddingService(db)
     
-    async def process_call_for_qa_pairs(self, call_sid: str) -> Dict[str, Any]:
+    async def process_call(
+        self,
+        call_sid: str,
+        force: bool = False,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
         """
-        Main method to process a call transcription and generate QA pairs
+        Process a call at most once at a time across all workers.
+        Concurrent requests in this process share one run; other workers are
+        excluded through a MongoDB lease. Calls already marked qa_processed are
+        skipped unless force is set.
         """
+        if not force and await self._is_processed(call_sid):
+            return self._already_processed(call_sid)
+        
+        return await call_processing_flights.do(
+            call_sid,
+            lambda: self._process_under_lease(call_sid, force, progress_callback)
+        )
+    
+    async def _is_processed(self, call_sid: str) -> bool:
+        call = await self.db.Call.find_one({"call_sid": call_sid}, {"qa_processed": 1})
+        return bool(call and call.get("qa_processed"))
+    
+    @staticmethod
+    def _already_processed(call_sid: str) -> Dict[str, Any]:
+        return {"success": True, "call_sid": call_sid, "skipped": True, "reason": "Call already processed", "processed": 0}
+    
+    async def _process_under_lease(
+        self,
+        call_sid: str,
+        force: bool,
+        progress_callback: Optional[ProgressCallback]
+    ) -> Dict[str, Any]:
+        lease = MongoLease(self.db)
+        lease_name = f"call_processing:{call_sid}"
+        waited = 0.0
+        
+        while not (token := await lease.acquire(lease_name, settings.CALL_LEASE_SECONDS)):
+            # Another worker is processing this call; its result is ours too
+            if waited >= settings.CALL_LEASE_WAIT_SECONDS:
+                # Transient: the job queue retries this with backoff
+                return {"error": "Call is being processed by another worker", "processed": 0, "retryable": True}
+            await asyncio.sleep(settings.CALL_LEASE_POLL_SECONDS)
+            waited += settings.CALL_LEASE_POLL_SECONDS
+            if await self._is_processed(call_sid):
+                return self._already_processed(call_sid)
+        
+        async def keep_alive():
+            while True:
+                await asyncio.sleep(settings.CALL_LEASE_SECONDS / 3)
+                await lease.renew(lease_name, token, settings.CALL_LEASE_SECONDS)
+        
+        renewer = asyncio.create_task(keep_alive())
         try:
+            # Re-check under the lease: a previous holder may have just finished
+            if not force and await self._is_processed(call_sid):
+                return self._already_processed(call_sid)
+            return await self.process_call_for_qa_pairs(call_sid, progress_callback)
+        finally:
+            renewer.cancel()
+            await lease.release(lease_name, token)
+    
+    async def process_call_for_qa_pairs(self, call_sid: str, progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        Main method to process a call transcription and generate QA pairs.
+        progress_callback, if given, is awaited at each pipeline stage.
+        Dependency outages (see is_transient) are raised so the job queue retries
+        the call; other failures are returned as {"error": ...}.
+        """
+        async def report(stage: str, **details):
+            if progress_callback:
+                try:
+                    await progress_callback(stage, details)
+                except Exception as e:
+                    logger.warning(f"Progress update failed for {call_sid}: {e}")
+        
+        try:
+            await report("fetching")
             # Get call record with transcription
-            call_record = await self.db.Call.find_one({"call_sid": call_sid})
-            if not call_record or not call_record.get("call_transcript"):
-                call_record = await self.db.AICallLog.find_one({"call_sid": call_sid})
-                if not call_record:
-                    return {"error": "Call record or transcription not found", "processed": 0}
+            with observe_stage("fetch"):
+                call_record = await self.db.Call.find_one({"call_sid": call_sid})
+                if not call_record or not call_record.get("call_transcript"):
+                    call_record = await self.db.AICallLog.find_one({"call_sid": call_sid})
+            if not call_record:
+                return {"error": "Call record or transcription not found", "processed": 0}
             
             org_id = call_record["organizationId"]
-            print(f"\n\n Organization id: {org_id}\n id type {type(org_id)}\n\n ")
+            current_org_id.set(str(org_id))
+            logger.debug(f"Organization id {org_id} ({type(org_id).__name__}) for call {call_sid}")
 
             if not org_id:
                 return {"error": "Organization not found for this call", "processed": 0}
             
             # Get organization questions using string org_id
-            questions = await self.db.questions.find({"org_id": str(org_id)}).to_list(length=None)
-            print(f"\n\n questions {questions} \n\n")
-            print(f"\n\n call transcript{call_record.get('call_transcript')}\n\n")
+            with observe_stage("fetch"):
+                questions = await self.db.questions.find({"org_id": str(org_id)}).to_list(length=None)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Loaded call inputs", extra={
+                    "call_sid": call_sid,
+                    "questions": [question["question_text"] for question in questions],
+                    "call_transcript": call_record.get("call_transcript")
+                })
 
             if not questions:
                 return {"error": "No questions found for organization", "processed": 0}
             
-            print(f"\n\n call sid: {call_sid}\n\n")
+            await report("embedding", questions_total=len(questions))
 
             # Store call transcription in vector database using call_sid as conversation_id
             await self.vector_service.store_conversation(call_sid, call_record["call_transcript"])
-            print(f"✅ Stored conversation in vector DB for {call_sid}")
+            logger.debug(f"Stored conversation in vector DB for {call_sid}")
             
             # Process each question and generate QA pairs
             processed_count = 0
             qa_pairs_to_insert = []
             
-            for question in questions:
-                try:
-                    # Extract answer using RAG
-                    extraction_result = await self.extract_answer(
-                        conversation_id=call_sid,
-                        question=question["question_text"],
-                        question_lead=question.get("question_keywords", [])
-                    )
-                    
-                    print(f"🔍 Question: {question['question_text']}")
-                    print(f"📝 Answer: {extraction_result['answer']}")
-                    print(f"📊 Chunks used: {extraction_result['chunks_used']}")
-                    
-                    # Create QA pair
-                    qa_pair = {
-                        "org_id": org_id,
-                        "conv_id": call_sid,
-                        "question": question["question_text"],
-                        "answer": extraction_result["answer"],
-                        "createdAt": call_record.get("createdAt") or call_record.get("call_started_at")
-                    }
-                    qa_pairs_to_insert.append(qa_pair)
-                    processed_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error processing question '{question['question_text']}': {e}")
+            await report("retrieving", questions_total=len(questions))
+            
+            # Retrieve chunks for every question with one batched search,
+            # using the query embeddings stored on the questions
+            search_queries = [
+                self._build_search_query(question["question_text"], question.get("question_keywords", []))
+                for question in questions
+            ]
+            try:
+                query_embeddings = await self.question_embeddings.load_query_embeddings(questions)
+            except Exception as e:
+                logger.error(f"Failed to load question embeddings, encoding queries instead: {e}")
+                query_embeddings = None
+            retrieved_chunks = await self.vector_service.search_similar_batch(
+                conversation_id=call_sid,
+                queries=search_queries,
+                top_k=settings.TOP_K_RESULTS,
+                query_embeddings=query_embeddings
+            )
+            
+            await report("extracting", questions_total=len(questions))
+            extraction_results = await self.extract_answers(call_sid, questions, retrieved_chunks)
+            
+            for question, extraction_result in zip(questions, extraction_results):
+                if extraction_result is None:
                     continue
+                
+                logger.debug("Extracted answer", extra={
+                    "call_sid": call_sid,
+                    "question": question["question_text"],
+                    "answer": extraction_result["answer"],
+                    "chunks_used": extraction_result["chunks_used"]
+                })
+                
+                # Create QA pair
+                qa_pairs_to_insert.append(self.build_qa_pair(call_record, question, extraction_result))
+                processed_count += 1
+            
+            await report("saving", questions_total=len(questions), processed=processed_count)
             
             # Bulk insert QA pairs - This is the critical point where we save to MongoDB
             if qa_pairs_to_insert:
                 try:
-                    insert_result = await self.db.qa_pairs.insert_many(qa_pairs_to_insert)
-                    print(f"✅ Successfully inserted {len(qa_pairs_to_insert)} QA pairs to MongoDB")
+                    with observe_stage("insert"):
+                        await self.replace_qa_pairs([call_sid], qa_pairs_to_insert)
+                    logger.info(f"Inserted {len(qa_pairs_to_insert)} QA pairs for {call_sid}")
                     
                     # ONLY delete vector database AFTER successful MongoDB insertion
                     # This ensures we don't lose data if MongoDB insertion fails
                     try:
                         deletion_success = await self.vector_service.delete_conversation(call_sid)
                         if deletion_success:
-                            print(f"🗑️ Successfully deleted vector database data for conversation {call_sid}")
+                            logger.debug(f"Deleted vector database data for conversation {call_sid}")
                         else:
                             logger.warning(f"Failed to delete vector database data for {call_sid} but QA pairs were saved")
                     except Exception as delete_error:
                         # Log the deletion error but don't fail the entire process
                         # since the QA pairs were successfully saved
-                        logger.error(f"Error deleting vector data for {call_sid}: {delete_error}")
-                        print(f"⚠️ QA pairs saved successfully but failed to clean up vector data for {call_sid}")
+                        logger.error(f"QA pairs saved but failed to clean up vector data for {call_sid}: {delete_error}")
                     
                     # Mark call as processed for QA
                     await self.db.Call.update_one(
@@ -104,8 +234,16 @@ class RAGService:
                     
                 except Exception as insert_error:
                     logger.error(f"Failed to insert QA pairs to MongoDB: {insert_error}")
-                    # Don't delete vector data if MongoDB insertion failed
+                    # Don't delete persistent vector data if MongoDB insertion failed;
+                    # transient in-memory data would only leak until its TTL
+                    if not self.vector_service.backend.persistent:
+                        await self.vector_service.delete_conversation(call_sid)
+                    if is_transient(insert_error):
+                        raise
                     return {"error": f"Failed to save QA pairs: {str(insert_error)}", "processed": 0}
+            else:
+                # Nothing to save, release the stored chunks
+                await self.vector_service.delete_conversation(call_sid)
             
             return {
                 "success": True,
@@ -120,30 +258,280 @@ class RAGService:
             # Attempt cleanup on general error
             try:
                 await self.vector_service.delete_conversation(call_sid)
-                print(f"🗑️ Cleaned up vector data for failed conversation {call_sid}")
+                logger.debug(f"Cleaned up vector data for failed conversation {call_sid}")
             except:
                 pass
+            if is_transient(e):
+                raise
             return {"error": str(e), "processed": 0}
     
-    async def extract_answer(self, conversation_id: str, question: str, question_lead: List[str]) -> Dict[str, Any]:
-        """Extract answer from call transcription using RAG approach with better error handling"""
+    async def extract_answers(
+        self,
+        conversation_id: str,
+        questions: List[Dict[str, Any]],
+        retrieved_chunks: Optional[List[List[Dict[str, Any]]]] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Extract answers for all questions, in question order.
+        retrieved_chunks optionally holds pre-fetched search results per question.
+        Entries are None for questions that could not be processed.
+        """
+        semaphore = asyncio.Semaphore(max(settings.QA_EXTRACTION_CONCURRENCY, 1))
+        if settings.QA_EXTRACTION_MODE != "batched":
+            return await self._extract_individually(conversation_id, questions, semaphore, retrieved_chunks)
+        
+        batch_size = max(settings.QA_BATCH_SIZE, 1)
+        group_results = await asyncio.gather(*(
+            self.extract_answers_batched(
+                conversation_id,
+                questions[start:start + batch_size],
+                semaphore,
+                retrieved_chunks[start:start + batch_size] if retrieved_chunks is not None else None
+            )
+            for start in range(0, len(questions), batch_size)
+        ))
+        return [result for results in group_results for result in results]
+    
+    async def _extract_individually(
+        self,
+        conversation_id: str,
+        questions: List[Dict[str, Any]],
+        semaphore: Optional[asyncio.Semaphore] = None,
+        retrieved_chunks: Optional[List[List[Dict[str, Any]]]] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Extract answers with one LLM call per question, running up to the semaphore's limit concurrently"""
+        semaphore = semaphore or asyncio.Semaphore(max(settings.QA_EXTRACTION_CONCURRENCY, 1))
+        if retrieved_chunks is None:
+            retrieved_chunks = [None] * len(questions)
+        
+        async def extract(question: Dict[str, Any], relevant_chunks: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.extract_answer(
+                    conversation_id=conversation_id,
+                    question=question["question_text"],
+                    question_lead=question.get("question_keywords", []),
+                    relevant_chunks=relevant_chunks
+                )
+        
+        # return_exceptions keeps one failing question from cancelling the rest
+        outcomes = await asyncio.gather(
+            *(extract(question, chunks) for question, chunks in zip(questions, retrieved_chunks)),
+            return_exceptions=True
+        )
+        
+        # An outage fails the whole call so it is retried, not saved with gaps
+        for outcome in outcomes:
+            if isinstance(outcome, Exception) and is_transient(outcome):
+                raise outcome
+        
+        results = []
+        for question, outcome in zip(questions, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Error processing question '{question['question_text']}': {outcome}")
+                results.append(None)
+            else:
+                results.append(outcome)
+        return results
+    
+    async def extract_answers_batched(
+        self,
+        conversation_id: str,
+        questions: List[Dict[str, Any]],
+        semaphore: Optional[asyncio.Semaphore] = None,
+        retrieved_chunks: Optional[List[List[Dict[str, Any]]]] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Extract answers for a group of questions with a single structured LLM call.
+        Falls back to per-question extraction for this group if the response is malformed.
+        """
+        semaphore = semaphore or asyncio.Semaphore(max(settings.QA_EXTRACTION_CONCURRENCY, 1))
         try:
-            # Create search query from question and leads
-            search_query = f"{question} {' '.join(question_lead)}"
-            print(f"🔎 Search query: {search_query}")
-            
-            # Search for relevant chunks
-            relevant_chunks = await self.vector_service.search_similar(
+            async with semaphore:
+                results = await self._request_batched_answers(conversation_id, questions, retrieved_chunks)
+        except Exception as e:
+            logger.error(f"Batched extraction failed for {conversation_id}: {e}")
+            if is_transient(e):
+                raise
+            results = None
+        
+        if results is None:
+            return await self._extract_individually(conversation_id, questions, semaphore, retrieved_chunks)
+        return results
+    
+    async def _request_batched_answers(
+        self,
+        conversation_id: str,
+        questions: List[Dict[str, Any]],
+        retrieved_chunks: Optional[List[List[Dict[str, Any]]]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Answer a group of questions with one LLM call, or return None if the response is malformed"""
+        if retrieved_chunks is None:
+            retrieved_chunks = await self.vector_service.search_similar_batch(
                 conversation_id=conversation_id,
-                query=search_query,
-                top_k=5
+                queries=[
+                    self._build_search_query(question["question_text"], question.get("question_keywords", []))
+                    for question in questions
+                ],
+                top_k=settings.TOP_K_RESULTS
             )
+        
+        # Collect the chunks relevant to any question in the group, each question's best matches first
+        chunks_by_id = {}
+        for rank in range(max((len(chunks) for chunks in retrieved_chunks), default=0)):
+            for chunks in retrieved_chunks:
+                if rank < len(chunks):
+                    chunks_by_id.setdefault(chunks[rank]["metadata"].get("chunk_id"), chunks[rank])
+        
+        relevant_chunks = list(chunks_by_id.values())
+        if not relevant_chunks:
+            relevant_chunks = await self.vector_service.get_all_chunks(conversation_id)
+        
+        if not relevant_chunks:
+            return [{
+                "answer": "No conversation data found for processing.",
+                "leads": question.get("question_keywords", []),
+                "chunks_used": 0
+            } for question in questions]
+        
+        # Overlapping text is sent once, in transcript order
+        context, chunks_used = build_context(relevant_chunks, settings.OPENAI_MODEL, settings.QA_BATCH_CONTEXT_TOKENS)
+        numbered_questions = "\n".join(
+            f"{number}. {question['question_text']}" for number, question in enumerate(questions, start=1)
+        )
+        
+        messages = [
+            {
+                "role": "system",
+                "content": """You are an expert at extracting information from call center conversations. 
+                
+                Your task:
+                1. Analyze the provided call transcript context
+                2. Answer every numbered question based on what you find
+                3. Be thorough but concise
+                4. If the exact information isn't present, provide the closest relevant information you can find
+                5. Only say "Information not available" if there's truly nothing relevant in the entire context
+                
+                Return one answer per question, using the question's number."""
+            },
+            {
+                "role": "user",
+                "content": f"""Call transcript context:
+{context}
+
+Questions to answer:
+{numbered_questions}
+
+Based on the above conversation, please provide a comprehensive answer to each question. Look for any relevant information that addresses the question, even if not explicitly stated."""
+            }
+        ]
+        
+        response = await self.ai_service.chat_completion_json(
+            messages,
+            schema=BATCH_ANSWERS_SCHEMA,
+            schema_name="call_answers",
+            temperature=0.1,
+            max_tokens=min(400 * len(questions), 16000)
+        )
+        answers = self._parse_batched_answers(response, len(questions))
+        if answers is None:
+            logger.warning(f"Malformed batched answers for {conversation_id}, falling back to per-question extraction")
+            return None
+        
+        results = []
+        for question, answer in zip(questions, answers):
+            if not answer or answer.strip().lower() in ['', 'none', 'n/a']:
+                answer = f"The call transcript was processed but no specific information was found to answer: {question['question_text']}"
+            results.append({
+                "answer": answer.strip(),
+                "leads": question.get("question_keywords", []),
+                "chunks_used": chunks_used
+            })
+        return results
+        
+    async def replace_qa_pairs(self, call_sids: List[str], qa_pairs: List[Dict[str, Any]]):
+        """
+        Store qa_pairs as the only pairs of call_sids. The new pairs are inserted
+        under a fresh run id before earlier runs' pairs are deleted, so a failed
+        insert leaves the previous pairs in place instead of none.
+        """
+        run_id = uuid.uuid4().hex
+        for pair in qa_pairs:
+            pair["run_id"] = run_id
+        try:
+            await self.db.qa_pairs.insert_many(qa_pairs, ordered=False)
+        except Exception:
+            # Remove whatever part of this run was written; the earlier pairs are still there
+            try:
+                await self.db.qa_pairs.delete_many({"conv_id": {"$in": call_sids}, "run_id": run_id})
+            except Exception as cleanup_error:
+                logger.error(f"Failed to remove partially inserted QA pairs of run {run_id}: {cleanup_error}")
+            raise
+        await self.db.qa_pairs.delete_many({"conv_id": {"$in": call_sids}, "run_id": {"$ne": run_id}})
+    
+    @staticmethod
+    def build_qa_pair(call_record: Dict[str, Any], question: Dict[str, Any], extraction_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the qa_pairs document for one answered question"""
+        return {
+            "org_id": call_record["organizationId"],
+            "conv_id": call_record["call_sid"],
+            "question": question["question_text"],
+            "answer": extraction_result["answer"],
+            "createdAt": call_record.get("createdAt") or call_record.get("call_started_at")
+        }
+    
+    @staticmethod
+    def _parse_batched_answers(response: Optional[Dict[str, Any]], question_count: int) -> Optional[List[str]]:
+        """Map a batched response back to question order, or None if it is incomplete"""
+        if not isinstance(response, dict) or not isinstance(response.get("answers"), list):
+            return None
+        
+        answers_by_number = {}
+        for item in response["answers"]:
+            if not isinstance(item, dict):
+                return None
+            number, answer = item.get("question_number"), item.get("answer")
+            if not isinstance(number, int) or not isinstance(answer, str):
+                return None
+            answers_by_number[number] = answer
+        
+        if any(number not in answers_by_number for number in range(1, question_count + 1)):
+            return None
+        return [answers_by_number[number] for number in range(1, question_count + 1)]
+    
+    @staticmethod
+    def _build_search_query(question: str, question_lead: List[str]) -> str:
+        """Build the retrieval query for a question and its keywords"""
+        return QuestionEmbeddingService.build_query_text(question, question_lead)
+    
+    async def extract_answer(
+        self,
+        conversation_id: str,
+        question: str,
+        question_lead: List[str],
+        relevant_chunks: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract answer from call transcription using RAG approach with better error handling.
+        relevant_chunks may be passed in when retrieval was already done in batch.
+        """
+        try:
+            if relevant_chunks is None:
+                # Create search query from question and leads
+                search_query = self._build_search_query(question, question_lead)
+                logger.debug(f"Search query: {search_query}")
+                
+                # Search for relevant chunks
+                relevant_chunks = await self.vector_service.search_similar(
+                    conversation_id=conversation_id,
+                    query=search_query,
+                    top_k=5
+                )
             
-            print(f"📋 Found {len(relevant_chunks)} relevant chunks")
+            logger.debug(f"Found {len(relevant_chunks)} relevant chunks")
             
             if not relevant_chunks:
                 # Try a fallback: search with just the question
-                print("⚠️ No chunks found with leads, trying question only...")
+                logger.debug("No chunks found with leads, trying question only")
                 relevant_chunks = await self.vector_service.search_similar(
                     conversation_id=conversation_id,
                     query=question,
@@ -152,7 +540,7 @@ class RAGService:
                 
                 if not relevant_chunks:
                     # Last resort: get entire conversation
-                    print("⚠️ No chunks found, attempting to get full conversation...")
+                    logger.debug("No chunks found, falling back to the full conversation")
                     relevant_chunks = await self.vector_service.get_all_chunks(conversation_id)
             
             if not relevant_chunks:
@@ -162,20 +550,9 @@ class RAGService:
                     "chunks_used": 0
                 }
             
-            # Combine chunks for context (limit to avoid token limits)
-            context_pieces = []
-            total_length = 0
-            max_context_length = 3000  # Adjust based on your token limits
-            
-            for chunk in relevant_chunks[:5]:  # Max 5 chunks
-                chunk_text = chunk["text"]
-                if total_length + len(chunk_text) > max_context_length:
-                    break
-                context_pieces.append(chunk_text)
-                total_length += len(chunk_text)
-            
-            context = "\n\n---\n\n".join(context_pieces)
-            print(f"📄 Context length: {len(context)} characters")
+            # Combine chunks for context within the model's token budget
+            context, chunks_used = build_context(relevant_chunks, settings.OPENAI_MODEL, settings.QA_CONTEXT_TOKENS)
+            logger.debug(f"Context length: {len(context)} characters")
             
             # IMPROVED: More flexible LLM prompt
             messages = [
@@ -212,11 +589,13 @@ Based on the above conversation, please provide a comprehensive answer to the qu
             return {
                 "answer": answer.strip(),
                 "leads": question_lead,
-                "chunks_used": len(context_pieces)
+                "chunks_used": chunks_used
             }
             
         except Exception as e:
             logger.error(f"Failed to extract answer: {e}")
+            if is_transient(e):
+                raise
             return {
                 "answer": f"Error occurred while processing the question: {question}. Please check the logs for details.",
                 "leads": [],
@@ -0,0 +1,184 @@
+# services/transcript_chunker.py
+import re
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# "Agent: ...", "Customer: ...", "Speaker 1: ..." at the start of a line
+SPEAKER_TURN_PATTERN = re.compile(r"^[ \t]*[A-Za-z][\w .'-]{0,40}:[ \t]", re.MULTILINE)
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]+(?:[.!?]+|$)")
+WORD_PATTERN = re.compile(r"\S+")
+_APPROX_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+Span = Tuple[int, int]
+
+def approximate_token_offsets(text: str) -> List[Span]:
+    """Word/punctuation spans, used when no model tokenizer is available"""
+    return [match.span() for match in _APPROX_TOKEN_PATTERN.finditer(text)]
+
+def tokenizer_offsets(tokenizer) -> Callable[[str], List[Span]]:
+    """
+    Token spans from a Hugging Face fast tokenizer. Uses a private copy of the
+    backend tokenizer with truncation off, so whole transcripts are tokenized
+    and the embedding model's own tokenizer settings are never touched.
+    """
+    from tokenizers import Tokenizer
+    backend = Tokenizer.from_str(tokenizer.backend_tokenizer.to_str())
+    backend.no_truncation()
+    backend.no_padding()
+    
+    def offsets(text: str) -> List[Span]:
+        return backend.encode(text, add_special_tokens=False).offsets
+    return offsets
+
+def _strip_span(text: str, start: int, end: int) -> Optional[Span]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if start < end else None
+
+class _TokenIndex:
+    """Token start offsets of one text, for counting the tokens in any character span"""
+    
+    def __init__(self, text: str, spans: List[Span]):
+        self.text = text
+        self.starts = [start for start, _ in spans]
+    
+    def count(self, start: int, end: int) -> int:
+        return bisect_left(self.starts, end) - bisect_left(self.starts, start)
+    
+    def position(self, offset: int) -> int:
+        """Index of the first token starting at or after offset"""
+        return bisect_left(self.starts, offset)
+
+class TranscriptChunker:
+    """
+    Splits call transcripts into chunks of at most max_tokens tokens. Chunks
+    break between speaker turns where possible, then between sentences, and
+    only split inside a sentence when one sentence alone exceeds the budget.
+    Each chunk after the first starts with up to overlap_tokens tokens from
+    the end of the previous one; that much of the budget is reserved when
+    packing. The text is tokenized once and chunks are yielded lazily with
+    character offsets into the original text.
+    """
+    
+    def __init__(self, max_tokens: int, overlap_tokens: int,
+                 tokenize: Callable[[str], List[Span]] = approximate_token_offsets):
+        self.max_tokens = max(max_tokens, 16)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.tokenize = tokenize
+    
+    def _turns(self, text: str) -> Iterator[Span]:
+        """Speaker turns, or lines/paragraphs when the transcript has no speaker labels"""
+        starts = [match.start() for match in SPEAKER_TURN_PATTERN.finditer(text)]
+        if not starts:
+            for match in re.finditer(r"[^\n]+", text):
+                span = _strip_span(text, match.start(), match.end())
+                if span:
+                    yield span
+            return
+        
+        if starts[0] > 0:
+            starts.insert(0, 0)
+        for start, end in zip(starts, starts[1:] + [len(text)]):
+            span = _strip_span(text, start, end)
+            if span:
+                yield span
+    
+    def _split_oversized(self, tokens: _TokenIndex, start: int, end: int, budget: int) -> Iterator[Tuple[int, int, int]]:
+        """Split a span that exceeds the budget into sentences, then word windows"""
+        text = tokens.text
+        for match in SENTENCE_PATTERN.finditer(text, start, end):
+            span = _strip_span(text, match.start(), match.end())
+            if not span:
+                continue
+            count = tokens.count(*span)
+            if count <= budget:
+                yield span[0], span[1], count
+                continue
+            
+            window_start = window_end = None
+            window_tokens = 0
+            for word in WORD_PATTERN.finditer(text, span[0], span[1]):
+                word_tokens = tokens.count(word.start(), word.end())
+                if window_start is not None and window_tokens + word_tokens > budget:
+                    yield window_start, window_end, window_tokens
+                    window_start = None
+                    window_tokens = 0
+                if word_tokens > budget:
+                    # A single "word" longer than the budget (e.g. a long unbroken string)
+                    yield from self._split_tokens(tokens, word.start(), word.end(), budget)
+                    continue
+                if window_start is None:
+                    window_start = word.start()
+                window_end = word.end()
+                window_tokens += word_tokens
+            if window_start is not None:
+                yield window_start, window_end, window_tokens
+    
+    @staticmethod
+    def _split_tokens(tokens: _TokenIndex, start: int, end: int, budget: int) -> Iterator[Tuple[int, int, int]]:
+        first, last = tokens.position(start), tokens.position(end)
+        for index in range(first, last, budget):
+            piece_start = start if index == first else tokens.starts[index]
+            piece_end = tokens.starts[index + budget] if index + budget < last else end
+            yield piece_start, piece_end, tokens.count(piece_start, piece_end)
+    
+    def _units(self, tokens: _TokenIndex, budget: int) -> Iterator[Tuple[int, int, int]]:
+        """(start, end, tokens) pieces that each fit within the budget"""
+        for start, end in self._turns(tokens.text):
+            count = tokens.count(start, end)
+            if count <= budget:
+                yield start, end, count
+            else:
+                yield from self._split_oversized(tokens, start, end, budget)
+    
+    def iter_chunks(self, text: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield {"text", "chunk_id", "start_index", "end_index", "token_count", "separator"}
+        with character offsets. separator is the transcript text between the previous
+        chunk and this one when they do not overlap, and "" otherwise.
+        """
+        tokens = _TokenIndex(text, self.tokenize(text))
+        # Units leave room for the overlap carried into every chunk after the first
+        unit_budget = self.max_tokens - self.overlap_tokens
+        chunk_start = chunk_end = None
+        chunk_number = 0
+        separator = ""
+        
+        for start, end, _ in self._units(tokens, unit_budget):
+            if chunk_start is not None and tokens.count(chunk_start, end) > self.max_tokens:
+                yield self._chunk(tokens, chunk_start, chunk_end, chunk_number, separator)
+                chunk_number += 1
+                chunk_start = self._overlap_start(tokens, chunk_start, chunk_end)
+                separator = "" if chunk_start is not None else text[chunk_end:start]
+            if chunk_start is None:
+                chunk_start = start
+            chunk_end = end
+        
+        if chunk_start is not None:
+            yield self._chunk(tokens, chunk_start, chunk_end, chunk_number, separator)
+    
+    def _overlap_start(self, tokens: _TokenIndex, start: int, end: int) -> Optional[int]:
+        """Where the next chunk starts to repeat the last overlap_tokens tokens of this one, at a word start"""
+        if not self.overlap_tokens:
+            return None
+        end_index = tokens.position(end)
+        # Keep the overlap shorter than the chunk it comes from
+        first = max(end_index - self.overlap_tokens, tokens.position(start) + 1)
+        for index in range(first, end_index):
+            offset = tokens.starts[index]
+            if tokens.text[offset - 1].isspace():
+                return offset
+        return None
+    
+    @staticmethod
+    def _chunk(tokens: _TokenIndex, start: int, end: int, chunk_number: int, separator: str) -> Dict[str, Any]:
+        return {
+            "text": tokens.text[start:end],
+            "chunk_id": f"chunk_{chunk_number}",
+            "start_index": start,
+            "end_index": end,
+            "token_count": tokens.count(start, end),
+            "separator": separator
+        }
@@ -0,0 +1,88 @@
+# services/validation_cache.py
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from core.config import settings
+
+class ValidationCache:
+    """
+    TTL + LRU cache of question validation results. Keys combine the org, the
+    normalized new question, the industry and a fingerprint of the org's
+    existing questions, so any change to the question set misses the cache.
+    """
+    
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, ...], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._org_keys: Dict[str, Set[Tuple[str, ...]]] = {}
+        self._hits = 0
+        self._misses = 0
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip().lower()
+    
+    @classmethod
+    def fingerprint(cls, question_texts: Iterable[str]) -> str:
+        """Order-independent hash of an org's existing questions"""
+        normalized = sorted(cls.normalize(text) for text in question_texts)
+        return hashlib.sha256("\n".join(normalized).encode("utf-8")).hexdigest()
+    
+    def _key(self, org_id: str, question: str, industry: str, fingerprint: str) -> Tuple[str, ...]:
+        return (org_id, self.normalize(question), self.normalize(industry or ""), fingerprint)
+    
+    def _discard(self, key: Tuple[str, ...]):
+        self._entries.pop(key, None)
+        org_keys = self._org_keys.get(key[0])
+        if org_keys is not None:
+            org_keys.discard(key)
+            if not org_keys:
+                del self._org_keys[key[0]]
+    
+    def get(self, org_id: str, question: str, industry: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        key = self._key(org_id, question, industry, fingerprint)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._discard(key)
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return dict(entry[1])
+    
+    def put(self, org_id: str, question: str, industry: str, fingerprint: str, result: Dict[str, Any]):
+        if self.max_entries <= 0:
+            return
+        key = self._key(org_id, question, industry, fingerprint)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(result))
+        self._entries.move_to_end(key)
+        self._org_keys.setdefault(org_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+    
+    def invalidate_org(self, org_id: str):
+        """Drop every cached result for an org after its questions change"""
+        for key in list(self._org_keys.get(org_id, ())):
+            self._discard(key)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0
+        }
+
+# Global instance
+validation_cache = ValidationCache(
+    max_entries=settings.VALIDATION_CACHE_SIZE,
+    ttl_seconds=settings.VALIDATION_CACHE_TTL_SECONDS
+)
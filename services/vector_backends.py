@@ -0,0 +1,555 @@
+# services/vector_backends.py
+from abc import ABC, abstractmethod
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+from typing import List, Dict, Any, Optional, Set, Tuple
+import numpy as np
+import logging
+from core.config import settings
+import asyncio
+import os
+import shutil
+import sqlite3
+import stat
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; tombstones are then only shared between threads
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+def top_k_similar(query_embeddings: np.ndarray, chunk_embeddings: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score every query against every chunk with one matrix product.
+    Returns (indices, similarities), each of shape (n_queries, k), best match first.
+    """
+    queries = np.asarray(query_embeddings, dtype=np.float32)
+    chunks = np.asarray(chunk_embeddings, dtype=np.float32)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    chunks = chunks / np.maximum(np.linalg.norm(chunks, axis=1, keepdims=True), 1e-12)
+    
+    scores = queries @ chunks.T
+    k = min(top_k, scores.shape[1])
+    if k < scores.shape[1]:
+        indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    
+    # argpartition leaves the top-k unordered; sort just those k
+    top_scores = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+def format_results(
+    documents: List[str],
+    metadatas: List[Dict[str, Any]],
+    indices: np.ndarray,
+    similarities: np.ndarray
+) -> List[List[Dict[str, Any]]]:
+    """Turn top-k indices and similarities into per-query chunk results"""
+    return [[{
+        "text": documents[index],
+        "metadata": metadatas[index],
+        "similarity": max(0.0, float(similarity))
+    } for index, similarity in zip(row_indices, row_similarities)]
+        for row_indices, row_similarities in zip(indices.tolist(), similarities.tolist())]
+
+class VectorBackend(ABC):
+    """Storage interface for per-conversation chunk embeddings"""
+    
+    # Whether stored data survives a process restart
+    persistent = False
+    
+    @abstractmethod
+    def add(
+        self,
+        conversation_id: str,
+        ids: List[str],
+        embeddings: np.ndarray,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        ...
+    
+    @abstractmethod
+    def count(self, conversation_id: str) -> int:
+        ...
+    
+    @abstractmethod
+    def get(self, conversation_id: str, include_embeddings: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Return {"embeddings", "documents", "metadatas"} for a conversation, or None if it is unknown.
+        embeddings is a float32 array when include_embeddings is set, otherwise None.
+        """
+        ...
+    
+    def query(self, conversation_id: str, query_embeddings: np.ndarray, top_k: int) -> List[List[Dict[str, Any]]]:
+        """Return the top_k most similar chunks for each query embedding"""
+        data = self.get(conversation_id, include_embeddings=True)
+        if not data or len(data["documents"]) == 0:
+            return [[] for _ in range(len(query_embeddings))]
+        indices, similarities = top_k_similar(query_embeddings, data["embeddings"], top_k)
+        return format_results(data["documents"], data["metadatas"], indices, similarities)
+    
+    @abstractmethod
+    async def delete(self, conversation_id: str) -> bool:
+        ...
+    
+    # Whether sweep() has deferred deletions to reclaim
+    has_pending_cleanup = False
+    
+    def sweep(self, orphan_grace_seconds: float = 300.0) -> Dict[str, int]:
+        """Reclaim storage left by deletes; blocking, so run it off the event loop"""
+        return {}
+
+class _MemoryCollection:
+    __slots__ = ("embeddings", "documents", "metadatas", "ids", "created_at")
+    
+    def __init__(self, dimension: int):
+        self.embeddings = np.empty((0, dimension), dtype=np.float32)
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.ids: List[str] = []
+        self.created_at = time.monotonic()
+
+class InMemoryVectorBackend(VectorBackend):
+    """
+    Process-local store for transient per-call chunks.
+    Embeddings are kept as one contiguous float32 array per conversation with
+    documents and metadata alongside; nothing touches the disk.
+    """
+    
+    def __init__(self, ttl_seconds: int = 3600):
+        self.ttl_seconds = ttl_seconds
+        self._collections: Dict[str, _MemoryCollection] = {}
+    
+    def _evict_expired(self):
+        """Drop conversations left behind by runs that never reached delete"""
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [cid for cid, collection in self._collections.items() if collection.created_at < cutoff]
+        for conversation_id in expired:
+            del self._collections[conversation_id]
+            logger.warning(f"Evicted expired in-memory vectors for conversation {conversation_id}")
+    
+    def add(self, conversation_id, ids, embeddings, documents, metadatas):
+        self._evict_expired()
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        collection = self._collections.get(conversation_id)
+        if collection is None:
+            collection = self._collections[conversation_id] = _MemoryCollection(embeddings.shape[1])
+        
+        collection.embeddings = np.ascontiguousarray(np.concatenate([collection.embeddings, embeddings]))
+        collection.documents.extend(documents)
+        collection.metadatas.extend(metadatas)
+        collection.ids.extend(ids)
+    
+    def count(self, conversation_id: str) -> int:
+        collection = self._collections.get(conversation_id)
+        return len(collection.documents) if collection else 0
+    
+    def get(self, conversation_id: str, include_embeddings: bool = False) -> Optional[Dict[str, Any]]:
+        collection = self._collections.get(conversation_id)
+        if collection is None:
+            return None
+        return {
+            "embeddings": collection.embeddings if include_embeddings else None,
+            "documents": collection.documents,
+            "metadatas": collection.metadatas
+        }
+    
+    async def delete(self, conversation_id: str) -> bool:
+        return self._collections.pop(conversation_id, None) is not None
+    
+    @property
+    def conversation_count(self) -> int:
+        return len(self._collections)
+
+class ChromaTombstones:
+    """
+    Conversations whose Chroma collections are pending deletion, in an
+    append-only file shared by every worker process so a crashed run's
+    deletions are finished on startup. Every operation holds an flock on
+    the log's lock file and first applies the lines other processes have
+    appended; a compaction rewrites the file under a new header line, which
+    tells readers to re-read it from the start.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._lock_file = None
+        self._pending: Set[str] = set()
+        self._header: Optional[bytes] = None
+        self._offset = 0
+    
+    @contextmanager
+    def locked(self):
+        """Hold the tombstones across processes; re-entrant within a thread"""
+        with self._lock:
+            if self._depth == 0:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._lock_file = open(f"{self.path}.lock", "a")
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                self._reload()
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    # Closing the file releases the flock
+                    self._lock_file.close()
+                    self._lock_file = None
+    
+    def _reload(self):
+        """Apply lines appended since the last read, starting over if the file was compacted"""
+        try:
+            with open(self.path, "rb") as f:
+                header = f.readline()
+                if header != self._header:
+                    self._header = header
+                    self._pending.clear()
+                    self._offset = 0
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            self._header = None
+            self._pending.clear()
+            self._offset = 0
+            return
+        except Exception as e:
+            logger.error(f"Failed to read vector tombstones from {self.path}: {e}")
+            return
+        
+        # A line without its newline is still being written by a crashed process; leave it
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        for line in complete.decode("utf-8").splitlines():
+            action, _, conversation_id = line.partition(" ")
+            if action == "+":
+                self._pending.add(conversation_id)
+            elif action == "-":
+                self._pending.discard(conversation_id)
+    
+    @staticmethod
+    def _new_header() -> str:
+        return f"# tombstones {uuid.uuid4().hex}\n"
+    
+    def _append(self, action: str, conversation_id: str):
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                if f.tell() == 0:
+                    f.write(self._new_header())
+                f.write(f"{action} {conversation_id}\n")
+        except Exception as e:
+            logger.error(f"Failed to write vector tombstone for {conversation_id}: {e}")
+    
+    def add(self, conversation_id: str):
+        with self.locked():
+            self._pending.add(conversation_id)
+            self._append("+", conversation_id)
+    
+    def discard(self, conversation_id: str):
+        with self.locked():
+            if conversation_id in self._pending:
+                self._pending.discard(conversation_id)
+                self._append("-", conversation_id)
+    
+    def __contains__(self, conversation_id: str) -> bool:
+        with self.locked():
+            return conversation_id in self._pending
+    
+    def pending(self) -> List[str]:
+        with self.locked():
+            return list(self._pending)
+    
+    def compact(self):
+        """Rewrite the file with only the tombstones still pending in any process"""
+        with self.locked():
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".",
+                                                prefix=f"{os.path.basename(self.path)}.", suffix=".tmp")
+                header = self._new_header()
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(header)
+                    f.writelines(f"+ {conversation_id}\n" for conversation_id in sorted(self._pending))
+                os.replace(tmp_path, self.path)
+                self._header = header.encode("utf-8")
+                self._offset = os.path.getsize(self.path)
+            except Exception as e:
+                logger.error(f"Failed to compact vector tombstones: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+class ChromaVectorBackend(VectorBackend):
+    """
+    Persistent ChromaDB storage, one collection per conversation.
+    delete() only records a tombstone; collections and their segment folders
+    are reclaimed by sweep(), which runs off the event loop (see VectorSweeper).
+    Finishing a tombstoned delete holds the tombstones' cross-process lock, so
+    no worker's sweeper removes a collection create_collection has just recreated.
+    """
+    
+    persistent = True
+    
+    def __init__(self):
+        self.client = None
+        self.tombstones = ChromaTombstones(os.path.join(settings.CHROMADB_PATH, "tombstones.log"))
+        self.last_activity = time.monotonic()
+        self.initialize()
+    
+    def initialize(self):
+        """Initialize ChromaDB client"""
+        try:
+            os.makedirs(settings.CHROMADB_PATH, exist_ok=True)
+            self.client = chromadb.PersistentClient(
+                path=settings.CHROMADB_PATH,
+                settings=ChromaSettings(anonymized_telemetry=False)
+            )
+            logger.info("ChromaDB vector backend initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize vector service: {e}")
+            raise
+    
+    def create_collection(self, conversation_id: str) -> Any:
+        """Create a new collection for a conversation"""
+        try:
+            with self.tombstones.locked():
+                # Re-processing a deleted conversation: finish the pending delete so old chunks don't linger
+                self._finish_delete(conversation_id)
+                
+                collection = self.get_collection(conversation_id)
+                if collection:
+                    return collection
+                
+                collection_name = f"conversation_{conversation_id}"
+                collection = self.client.create_collection(
+                    name=collection_name,
+                    metadata={"conversation_id": conversation_id}
+                )
+                return collection
+        except Exception as e:
+            logger.error(f"Failed to create collection: {e}")
+            raise
+    
+    def get_collection(self, conversation_id: str) -> Any:
+        """Get existing collection for a conversation, or None if missing or tombstoned"""
+        self.last_activity = time.monotonic()
+        if conversation_id in self.tombstones:
+            return None
+        try:
+            collection_name = f"conversation_{conversation_id}"
+            return self.client.get_collection(collection_name)
+        except Exception as e:
+            logger.debug(f"Collection not found for {conversation_id}: {e}")
+            return None
+    
+    async def delete(self, conversation_id: str) -> bool:
+        """Tombstone a conversation; the sweeper removes its collection later"""
+        try:
+            await asyncio.to_thread(self._tombstone, conversation_id)
+            logger.info(f"Tombstoned vectors for conversation: {conversation_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to delete conversation {conversation_id}: {e}")
+            return False
+    
+    def _tombstone(self, conversation_id: str):
+        with self.tombstones.locked():
+            self.tombstones.add(conversation_id)
+    
+    def _finish_delete(self, conversation_id: str) -> bool:
+        """
+        Delete a tombstoned collection and clear its tombstone; False if it was not tombstoned.
+        Callers hold tombstones.locked(), so the tombstone is re-checked and claimed atomically.
+        """
+        if conversation_id not in self.tombstones:
+            return False
+        deleted = self._delete_collection(conversation_id)
+        self.tombstones.discard(conversation_id)
+        return deleted
+    
+    @property
+    def has_pending_cleanup(self) -> bool:
+        return bool(self.tombstones.pending())
+    
+    def _delete_collection(self, conversation_id: str) -> bool:
+        collection_name = f"conversation_{conversation_id}"
+        try:
+            self.client.delete_collection(collection_name)
+            logger.info(f"Deleted ChromaDB collection: {collection_name}")
+            return True
+        except Exception as e:
+            # Already gone (e.g. deleted before a crash) counts as done
+            logger.debug(f"Collection {collection_name} not deleted: {e}")
+            return False
+    
+    def _referenced_segment_ids(self) -> Optional[Set[str]]:
+        """Segment ids Chroma still knows about, read from its sqlite catalog"""
+        db_path = os.path.join(settings.CHROMADB_PATH, "chroma.sqlite3")
+        if not os.path.exists(db_path):
+            return None
+        try:
+            connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5)
+            try:
+                return {str(row[0]) for row in connection.execute("SELECT id FROM segments")}
+            finally:
+                connection.close()
+        except Exception as e:
+            logger.warning(f"Failed to read Chroma segments catalog: {e}")
+            return None
+    
+    def _orphan_folders(self, grace_seconds: float) -> List[str]:
+        """UUID segment folders no longer referenced by any collection"""
+        # List folders before reading the catalog: segment rows are written before their folders
+        folders = self._get_uuid_folders()
+        if not folders:
+            return []
+        referenced = self._referenced_segment_ids()
+        if referenced is None:
+            return []
+        
+        cutoff = time.time() - grace_seconds
+        orphans = []
+        for folder in folders:
+            if folder in referenced:
+                continue
+            try:
+                if os.path.getmtime(os.path.join(settings.CHROMADB_PATH, folder)) > cutoff:
+                    continue
+            except OSError:
+                continue
+            orphans.append(folder)
+        return orphans
+    
+    def _remove_folder(self, uuid_folder: str) -> bool:
+        """Remove a segment folder; files still held open are retried on the next sweep"""
+        folder_path = os.path.join(settings.CHROMADB_PATH, uuid_folder)
+        
+        def make_writable_and_retry(func, path, exc_info):
+            os.chmod(path, stat.S_IWRITE)
+            func(path)
+        
+        try:
+            shutil.rmtree(folder_path, onerror=make_writable_and_retry)
+            logger.info(f"Deleted orphaned UUID folder: {uuid_folder}")
+            return True
+        except FileNotFoundError:
+            return True
+        except Exception as e:
+            logger.warning(f"Could not delete UUID folder {uuid_folder}, will retry: {e}")
+            return False
+    
+    def sweep(self, orphan_grace_seconds: float = 300.0) -> Dict[str, int]:
+        """
+        Reclaim tombstoned collections and orphaned segment folders.
+        Blocking; run it in a worker thread.
+        """
+        collections_deleted = 0
+        for conversation_id in self.tombstones.pending():
+            # The snapshot may be stale: create_collection can have finished this delete already
+            with self.tombstones.locked():
+                if self._finish_delete(conversation_id):
+                    collections_deleted += 1
+        self.tombstones.compact()
+        
+        orphans = self._orphan_folders(orphan_grace_seconds)
+        folders_deleted = sum(1 for folder in orphans if self._remove_folder(folder))
+        return {
+            "collections_deleted": collections_deleted,
+            "folders_deleted": folders_deleted,
+            "folders_pending": len(orphans) - folders_deleted
+        }
+    
+    def _get_uuid_folders(self) -> List[str]:
+        """Get all UUID folders in vector_db directory"""
+        try:
+            uuid_folders = []
+            if not os.path.exists(settings.CHROMADB_PATH):
+                return uuid_folders
+                
+            for item in os.listdir(settings.CHROMADB_PATH):
+                item_path = os.path.join(settings.CHROMADB_PATH, item)
+                if os.path.isdir(item_path) and self._is_uuid_folder(item):
+                    uuid_folders.append(item)
+            return uuid_folders
+        except Exception as e:
+            logger.error(f"Failed to get UUID folders: {e}")
+            return []
+    
+    def _is_uuid_folder(self, folder_name: str) -> bool:
+        """Check if folder name matches UUID format"""
+        uuid_pattern = r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+        return bool(re.match(uuid_pattern, folder_name, re.IGNORECASE))
+    
+    def add(self, conversation_id, ids, embeddings, documents, metadatas):
+        collection = self.create_collection(conversation_id)
+        collection.add(
+            embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids
+        )
+    
+    def count(self, conversation_id: str) -> int:
+        collection = self.get_collection(conversation_id)
+        return collection.count() if collection else 0
+    
+    def get(self, conversation_id: str, include_embeddings: bool = False) -> Optional[Dict[str, Any]]:
+        collection = self.get_collection(conversation_id)
+        if not collection:
+            return None
+        
+        include = ['documents', 'metadatas'] + (['embeddings'] if include_embeddings else [])
+        results = collection.get(include=include)
+        embeddings = None
+        if include_embeddings:
+            embeddings = np.asarray(results['embeddings'], dtype=np.float32) if results['embeddings'] is not None else np.empty((0, 0), dtype=np.float32)
+        return {
+            "embeddings": embeddings,
+            "documents": results['documents'] or [],
+            "metadatas": results['metadatas'] or []
+        }
+    
+    def query(self, conversation_id: str, query_embeddings: np.ndarray, top_k: int) -> List[List[Dict[str, Any]]]:
+        """Query through Chroma's HNSW index"""
+        collection = self.get_collection(conversation_id)
+        count = collection.count() if collection else 0
+        if count == 0:
+            return [[] for _ in range(len(query_embeddings))]
+        
+        results = collection.query(
+            query_embeddings=np.asarray(query_embeddings, dtype=np.float32).tolist(),
+            n_results=min(top_k, count),
+            include=['documents', 'metadatas', 'distances']
+        )
+        
+        formatted_results = []
+        for documents, metadatas, distances in zip(results['documents'], results['metadatas'], results['distances']):
+            formatted_results.append([{
+                "text": doc,
+                "metadata": metadatas[i],
+                "similarity": max(0.0, 1 - distances[i])
+            } for i, doc in enumerate(documents)])
+        return formatted_results
+
+# Shared across VectorService instances so a call's chunks outlive the request-scoped service
+memory_vector_backend = InMemoryVectorBackend(ttl_seconds=settings.VECTOR_MEMORY_TTL_SECONDS)
+
+def create_vector_backend() -> VectorBackend:
+    """Return the backend selected by settings.VECTOR_BACKEND"""
+    if settings.VECTOR_BACKEND == "chroma":
+        return ChromaVectorBackend()
+    if settings.VECTOR_BACKEND == "memory":
+        return memory_vector_backend
+    raise ValueError(f"Unknown vector backend: {settings.VECTOR_BACKEND}")
@@ -0,0 +1,87 @@
+# services/vector_sweeper.py
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+from core.config import settings
+from services.vector_backends import VectorBackend
+
+logger = logging.getLogger(__name__)
+
+class VectorSweeper:
+    """
+    Background task that reclaims deleted vector storage off the event loop.
+    Sweeps once at startup to finish a crashed run's deletions, then whenever
+    the backend has been idle for idle_seconds or interval_seconds have passed.
+    """
+    
+    def __init__(self, interval_seconds: float, idle_seconds: float, orphan_grace_seconds: float, poll_seconds: float = 5.0):
+        self.interval_seconds = interval_seconds
+        self.idle_seconds = idle_seconds
+        self.orphan_grace_seconds = orphan_grace_seconds
+        self.poll_seconds = poll_seconds
+        self._backend: Optional[VectorBackend] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_sweep = 0.0
+        self._sweeps = 0
+        self._totals: Dict[str, int] = {}
+        self._last_result: Dict[str, int] = {}
+    
+    async def start(self, backend: VectorBackend):
+        if not backend.persistent or self._task is not None:
+            return
+        self._backend = backend
+        await self.sweep()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Vector sweeper started")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def sweep(self) -> Dict[str, int]:
+        try:
+            result = await asyncio.to_thread(self._backend.sweep, self.orphan_grace_seconds)
+        except Exception as e:
+            logger.error(f"Vector sweep failed: {e}")
+            return {}
+        finally:
+            self._last_sweep = time.monotonic()
+        
+        self._sweeps += 1
+        self._last_result = result
+        for name, value in result.items():
+            self._totals[name] = self._totals.get(name, 0) + value
+        if any(result.values()):
+            logger.info(f"Vector sweep: {result}")
+        return result
+    
+    def _due(self) -> bool:
+        now = time.monotonic()
+        if now - self._last_sweep >= self.interval_seconds:
+            return True
+        idle_for = now - getattr(self._backend, "last_activity", now)
+        return self._backend.has_pending_cleanup and idle_for >= self.idle_seconds
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            if self._due():
+                await self.sweep()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "sweeps": self._sweeps,
+            "last_result": self._last_result,
+            "totals": self._totals
+        }
+
+# Global instance
+vector_sweeper = VectorSweeper(
+    interval_seconds=settings.VECTOR_SWEEP_INTERVAL_SECONDS,
+    idle_seconds=settings.VECTOR_SWEEP_IDLE_SECONDS,
+    orphan_grace_seconds=settings.VECTOR_ORPHAN_GRACE_SECONDS
+)